@@ -0,0 +1,236 @@
+import argparse
+import hashlib
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from chord_transpose import CHORD_PATTERN, NOTE_INDEX
+from Create_module import ChordClassifier
+
+
+def chord_parts(label):
+    """
+    Split a chord label into its root pitch class and its quality.
+
+    Returns:
+    tuple: (pitch class 0-11, quality such as 'm' or 'dim'), or None if the label is not a chord.
+    """
+    match = CHORD_PATTERN.match(label)
+    if not match or match.group(3):
+        return None  # Slash chords are not transposed as training labels
+    return NOTE_INDEX[match.group(1)], match.group(2)
+
+
+def semitone_distance(source_label, target_label):
+    """
+    Return the smallest shift (-6 to 5 semitones) that turns one chord into the other, or None if
+    they differ in quality, so a transposed example can be relabelled without listening to it.
+    """
+    source, target = chord_parts(source_label), chord_parts(target_label)
+    if source is None or target is None or source[1] != target[1]:
+        return None
+    return (target[0] - source[0] + 6) % 12 - 6
+
+
+class FeatureAugmenter:
+    """
+    This class balances a chord dataset by generating extra training examples for the smaller classes.
+    Missing examples are first taken from other chords of the same quality, transposed to the class
+    and relabelled symbolically; their pitch-shifted features are rendered in parallel and cached on
+    disk, and only as many as the deficits need. The rest are noise-jittered copies made directly in
+    the feature domain, which costs no audio processing at all.
+    """
+
+    def __init__(self, extract_features, shift_cache_dir=None, max_shift=4, noise_scale=0.1, workers=None,
+                 random_state=42):
+        """
+        Initialize the augmenter.
+
+        Parameters:
+        extract_features (callable): extract_features(audio_file, semitones) -> feature vector or None,
+                                     e.g. ChordClassifier.extract_features; must be picklable.
+        shift_cache_dir (str): Optional directory caching the features of pitch-shifted files.
+        max_shift (int): Largest transposition in semitones; larger shifts sound less natural.
+        noise_scale (float): Standard deviation of the feature noise, relative to each class's spread.
+        workers (int): Number of processes rendering pitch-shifted features, defaults to the number of CPUs.
+        random_state (int): Seed for choosing sources and drawing noise.
+        """
+        self.extract_features = extract_features
+        self.shift_cache_dir = shift_cache_dir
+        self.max_shift = max_shift
+        self.noise_scale = noise_scale
+        self.workers = workers or os.cpu_count()
+        self.rng = np.random.default_rng(random_state)
+
+    def plan_shifts(self, labels, deficits):
+        """
+        Choose the transposed examples to render for each class, preferring small shifts.
+
+        Parameters:
+        labels (np.ndarray): Label of each original row.
+        deficits (dict): Class label -> number of examples missing.
+
+        Returns:
+        list: (source row, semitones, target label) triples.
+        """
+        plan = []
+        for target, deficit in deficits.items():
+            candidates = []
+            for source_label in np.unique(labels):
+                shift = semitone_distance(source_label, target)
+                if shift and abs(shift) <= self.max_shift:
+                    rows = np.flatnonzero(labels == source_label)
+                    candidates.extend((abs(shift), self.rng.random(), row, shift) for row in rows)
+            candidates.sort()
+            plan.extend((row, shift, target) for _, _, row, shift in candidates[:deficit])
+        return plan
+
+    def shift_cache_path(self, audio_file, semitones):
+        """Return the cache file of a pitch-shifted file's features, or None without a cache directory."""
+        if not self.shift_cache_dir:
+            return None
+        stat = os.stat(audio_file)
+        identity = f"{os.path.abspath(audio_file)}|{stat.st_size}|{stat.st_mtime_ns}|{semitones}"
+        return os.path.join(self.shift_cache_dir, hashlib.sha1(identity.encode()).hexdigest() + '.npy')
+
+    def render_shifts(self, filenames, plan):
+        """
+        Compute the features of the planned transpositions, in parallel and through the cache.
+
+        Parameters:
+        filenames (np.ndarray): Audio file of each original row.
+        plan (list): Triples from plan_shifts.
+
+        Returns:
+        tuple: Features of each planned example (None where extraction failed) and the number rendered.
+        """
+        results = [None] * len(plan)
+        pending = []
+        for index, (row, shift, _) in enumerate(plan):
+            cache_path = self.shift_cache_path(filenames[row], shift)
+            if cache_path and os.path.exists(cache_path):
+                results[index] = np.load(cache_path)
+            else:
+                pending.append((index, cache_path))
+        if pending:
+            if self.shift_cache_dir:
+                os.makedirs(self.shift_cache_dir, exist_ok=True)
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                features = executor.map(self.extract_features, [filenames[plan[index][0]] for index, _ in pending],
+                                        [plan[index][1] for index, _ in pending])
+                for (index, cache_path), feature in zip(pending, features):
+                    results[index] = feature
+                    if feature is not None and cache_path:
+                        np.save(cache_path, feature)
+        return results, len(pending)
+
+    def jitter(self, features, labels, target, count):
+        """
+        Make noisy copies of random examples of a class, directly in the feature domain.
+
+        Returns:
+        tuple: The new features and the row each one was copied from.
+        """
+        rows = np.flatnonzero(labels == target)
+        spread = features[rows].std(axis=0) if len(rows) > 1 else features.std(axis=0)
+        sources = self.rng.choice(rows, size=count)
+        noise = self.rng.standard_normal((count, features.shape[1])) * spread * self.noise_scale
+        return features[sources] + noise, sources
+
+    def balance(self, features, labels, filenames=None, target_count=None, extra_labels=()):
+        """
+        Generate examples until every class has target_count of them. Classes in extra_labels that
+        have no examples at all can only be filled by transposing other chords of the same quality.
+
+        Parameters:
+        features (np.ndarray): Original feature matrix.
+        labels (np.ndarray): Original labels.
+        filenames (np.ndarray): Audio file of each row; without it only feature noise is used.
+        target_count (int): Examples wanted per class, defaults to the size of the largest class.
+        extra_labels (tuple): Labels to generate even if no row has them, e.g. ('Bdim',).
+
+        Returns:
+        tuple: Augmented features, labels and source rows, and a summary dict.
+        """
+        counts = Counter(labels.tolist())
+        target_count = target_count or max(counts.values())
+        deficits = {label: target_count - count for label, count in counts.items() if count < target_count}
+        deficits.update((label, target_count) for label in extra_labels if label not in counts)
+
+        plan = self.plan_shifts(labels, deficits) if filenames is not None else []
+        rendered, rendered_count = self.render_shifts(filenames, plan) if plan else ([], 0)
+        new_features, new_labels, new_sources = [], [], []
+        for (row, _, target), feature in zip(plan, rendered):
+            if feature is not None:
+                new_features.append(feature)
+                new_labels.append(target)
+                new_sources.append(row)
+                deficits[target] -= 1
+        transposed = len(new_features)
+
+        unfilled = {}
+        for target, deficit in deficits.items():
+            if deficit > 0 and target not in counts:
+                unfilled[target] = deficit  # Nothing to jitter without a single example of the class
+            elif deficit > 0:
+                jittered, sources = self.jitter(features, labels, target, deficit)
+                new_features.extend(jittered)
+                new_labels.extend([target] * deficit)
+                new_sources.extend(sources)
+
+        width = features.shape[1]
+        augmented = (np.array(new_features, dtype=features.dtype).reshape(-1, width),
+                     np.array(new_labels, dtype=labels.dtype), np.array(new_sources, dtype=np.int64))
+        summary = {'target_count': target_count, 'transposed': transposed, 'rendered': rendered_count,
+                   'cached': len(plan) - rendered_count,
+                   'jittered': len(new_features) - transposed, 'unfilled': unfilled, 'before': counts}
+        return augmented + (summary,)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Balance the chord classes of a training feature cache.")
+    parser.add_argument('--features', required=True, help="Path to the .npz feature cache, updated in place.")
+    parser.add_argument('--csv', help="Dataset CSV, used to build the feature cache if it does not exist.")
+    parser.add_argument('--include-bdim', action='store_true',
+                        help="Keep Bdim when building the cache and generate Bdim examples by transposing other "
+                             "dim chords if the dataset has none.")
+    parser.add_argument('--target', type=int, help="Examples per class (default: size of the largest class).")
+    parser.add_argument('--max-shift', type=int, default=4)
+    parser.add_argument('--noise-scale', type=float, default=0.1)
+    parser.add_argument('--workers', type=int, help="Processes rendering pitch-shifted features (default: all CPUs).")
+    parser.add_argument('--shift-cache-dir', default=os.path.join(os.path.expanduser('~'), '.chords_cache', 'shifted'))
+    args = parser.parse_args()
+
+    classifier = ChordClassifier(args.csv)
+    features, labels = classifier.load_data(args.features, skip_labels=() if args.include_bdim else ('Bdim',))
+    if args.include_bdim and 'Bdim' not in labels:
+        # The cache was built without Bdim; rebuild it if the dataset actually has Bdim rows
+        if not args.csv:
+            parser.error("the feature cache has no Bdim rows; pass --csv to rebuild it with --include-bdim")
+        if 'Bdim' in classifier.dataset_labels():
+            print("The feature cache was built without Bdim; rebuilding it from the CSV.")
+            features, labels = classifier.load_data(args.features, skip_labels=(), rebuild=True)
+    filenames, _ = classifier.load_cache_extras(args.features)
+    if filenames is None:
+        print("The cache has no file names (it predates augmentation); only feature noise will be used.")
+
+    augmenter = FeatureAugmenter(classifier.extract_features, args.shift_cache_dir, args.max_shift,
+                                 args.noise_scale, args.workers)
+    start = time.perf_counter()
+    augmented_features, augmented_labels, sources, summary = augmenter.balance(
+        features, labels, filenames, args.target, extra_labels=('Bdim',) if args.include_bdim else ())
+    elapsed = time.perf_counter() - start
+    classifier.save_feature_cache(args.features, features, labels, filenames,
+                                  (augmented_features, augmented_labels, sources))
+
+    after = Counter(labels.tolist()) + Counter(augmented_labels.tolist())
+    for label in sorted(after):
+        print(f"{label:>6}: {summary['before'].get(label, 0):5d} -> {after[label]:5d}")
+    print(f"{len(augmented_labels)} examples added in {elapsed:.1f}s: {summary['transposed']} transposed "
+          f"({summary['rendered']} rendered, {summary['cached']} from the cache), "
+          f"{summary['jittered']} noise-jittered; {summary['rendered']} of the {11 * len(labels)} renders of "
+          f"transposing every file to all 12 keys")
+    for label, missing in sorted(summary['unfilled'].items()):
+        print(f"{label}: {missing} examples short; too few chords of the same quality within "
+              f"{args.max_shift} semitones to transpose, and no examples to jitter")
@@ -1,4 +1,7 @@
+import os
 from sign_in_window import AuthenticatedAudioPlayerApp
+from main_app_window import AudioPlayerApp
+from chord_backends import create_backend
 
 class MainApp:
     """
@@ -7,7 +10,13 @@ class MainApp:
     """
 
     def run(self):
-        """Initialize and run the authentication window."""
+        """
+        Initialize and run the authentication window, or with CHORDS_BACKEND=local run the player
+        directly on the local inference engine (no server and no sign-in needed).
+        """
+        if os.environ.get('CHORDS_BACKEND') == 'local':
+            AudioPlayerApp(backend=create_backend('local')).mainloop()
+            return
         auth_app = AuthenticatedAudioPlayerApp()
         auth_app.mainloop()
 
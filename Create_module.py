@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import numpy as np
 import librosa
@@ -22,18 +23,21 @@ class ChordClassifier:
         self.csv_path = csv_path
         self.model = None
 
-    def extract_features(self, audio_file):
+    def extract_features(self, audio_file, semitones=0):
         """
         Extract MFCC features from an audio file.
 
         Parameters:
         audio_file (str): Path to the audio file.
+        semitones (int): Optional pitch shift applied before extraction, used for augmentation.
 
         Returns:
         np.ndarray: Processed MFCC features.
         """
         try:
             audio, sample_rate = librosa.load(audio_file, res_type='kaiser_fast')
+            if semitones:
+                audio = librosa.effects.pitch_shift(audio, sr=sample_rate, n_steps=semitones)
             mfccs = librosa.feature.mfcc(y=audio, sr=sample_rate, n_mfcc=40)
             mfccs_processed = np.mean(mfccs.T, axis=0)
             return mfccs_processed
@@ -42,34 +46,124 @@ class ChordClassifier:
             print("Error details:", e)
             return None
 
-    def load_data(self):
+    def load_data(self, cache_path=None, skip_labels=('Bdim',), rebuild=False):
         """
         Load the dataset from the CSV file and extract features and labels.
 
+        Parameters:
+        cache_path (str): Optional path to a .npz feature cache. If the file exists the features are
+                          loaded from it, otherwise they are extracted and written to it.
+        skip_labels (tuple): Labels left out of the dataset when extracting.
+        rebuild (bool): Extract the features again even if the cache exists, e.g. with other skip_labels.
+
         Returns:
         tuple: A tuple containing the features and labels as numpy arrays.
         """
+        if cache_path and os.path.exists(cache_path) and not rebuild:
+            return self.load_feature_cache(cache_path)
+
         df = pd.read_csv(self.csv_path)
         features = []
         labels = []
+        filenames = []
 
         for index, row in df.iterrows():
-            if row['label'] == 'Bdim':  # Skip records where the label is 'Bdim'
+            if row['label'] in skip_labels:  # Skip records of excluded labels ('Bdim' by default)
                 continue
             audio_file = row['filename']
             feature = self.extract_features(audio_file)
             if feature is not None:
                 features.append(feature)
                 labels.append(row['label'])
+                filenames.append(audio_file)
+
+        features, labels = np.array(features), np.array(labels)
+        if cache_path:
+            self.save_feature_cache(cache_path, features, labels, filenames)
+        return features, labels
+
+    def dataset_labels(self):
+        """
+        Return the labels present in the dataset CSV, without extracting any features.
+
+        Returns:
+        set: The distinct labels.
+        """
+        return set(pd.read_csv(self.csv_path, usecols=['label'])['label'])
+
+    @staticmethod
+    def save_feature_cache(cache_path, features, labels, filenames=None, augmented=None):
+        """
+        Save extracted features and labels so later runs can skip audio decoding.
+
+        Parameters:
+        cache_path (str): Path to the .npz file.
+        features (np.ndarray): Feature matrix.
+        labels (np.ndarray): Label vector.
+        filenames (list): Optional audio file of each row, needed to render transposed copies.
+        augmented (tuple): Optional augmented (features, labels, sources) from Augment_data.py, where
+                           sources holds the row each augmented example was derived from.
+        """
+        arrays = {'features': features, 'labels': labels}
+        if filenames is not None:
+            arrays['filenames'] = np.asarray(filenames, dtype=str)
+        if augmented is not None:
+            arrays['augmented_features'], arrays['augmented_labels'], arrays['augmented_sources'] = augmented
+        np.savez(cache_path, **arrays)
+
+    @staticmethod
+    def load_feature_cache(cache_path):
+        """
+        Load features and labels previously saved with save_feature_cache.
+
+        Parameters:
+        cache_path (str): Path to the .npz file.
+
+        Returns:
+        tuple: A tuple containing the features and labels as numpy arrays.
+        """
+        with np.load(cache_path, allow_pickle=False) as cache:
+            return cache['features'], cache['labels']
 
-        return np.array(features), np.array(labels)
+    @staticmethod
+    def load_cache_extras(cache_path):
+        """
+        Load the optional parts of a feature cache.
+
+        Parameters:
+        cache_path (str): Path to the .npz file.
 
-    def train_model(self):
+        Returns:
+        tuple: The audio file of each row and the augmented (features, labels, sources), each None if missing.
+        """
+        with np.load(cache_path, allow_pickle=False) as cache:
+            filenames = cache['filenames'] if 'filenames' in cache else None
+            augmented = None
+            if 'augmented_features' in cache:
+                augmented = cache['augmented_features'], cache['augmented_labels'], cache['augmented_sources']
+        return filenames, augmented
+
+    def train_model(self, cache_path=None, augment=False):
         """
         Train the chord classification model using the dataset.
+
+        Parameters:
+        cache_path (str): Optional path to a .npz feature cache (see load_data).
+        augment (bool): Add the augmented examples stored in the cache by Augment_data.py to the training set.
         """
-        X, y = self.load_data()  # Load features and labels
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        X, y = self.load_data(cache_path)  # Load features and labels
+        train_index, test_index = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
+        X_train, X_test, y_train, y_test = X[train_index], X[test_index], y[train_index], y[test_index]
+        if augment:
+            _, augmented = self.load_cache_extras(cache_path) if cache_path else (None, None)
+            if augmented is None:
+                print("No augmented features in the cache, run Augment_data.py first.")
+            else:
+                augmented_features, augmented_labels, sources = augmented
+                # Only copies of training rows are used, so no variant of a test example is trained on
+                keep = np.isin(sources, train_index)
+                X_train = np.concatenate([X_train, augmented_features[keep]])
+                y_train = np.concatenate([y_train, augmented_labels[keep]])
         self.model = RandomForestClassifier(n_estimators=100)  # Initialize the model
         self.model.fit(X_train, y_train)  # Train the model
 
@@ -91,9 +185,10 @@ class ChordClassifier:
             print("No model has been trained yet.")
 
 
-# Example usage:
-csv_path = r'C:\Users\Amit Sibony\Downloads\chords_dataset.csv'
-classifier = ChordClassifier(csv_path)
-classifier.train_model()
-model_path = r'C:\Users\Amit Sibony\Downloads\trained_model2.joblib'
-classifier.save_model(model_path)
+if __name__ == "__main__":
+    # Example usage:
+    csv_path = r'C:\Users\Amit Sibony\Downloads\chords_dataset.csv'
+    classifier = ChordClassifier(csv_path)
+    classifier.train_model()
+    model_path = r'C:\Users\Amit Sibony\Downloads\trained_model2.joblib'
+    classifier.save_model(model_path)
@@ -0,0 +1,196 @@
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import confusion_matrix
+from Create_module import ChordClassifier
+
+# Per-process views of the shared feature files, set by load_shared_features
+shared_features = None
+shared_labels = None
+
+
+def load_shared_features(features_path, labels_path):
+    """
+    Worker initializer: map the feature and label files into memory without copying them.
+
+    Parameters:
+    features_path (str): Path to the .npy feature matrix.
+    labels_path (str): Path to the .npy encoded label vector.
+    """
+    global shared_features, shared_labels
+    shared_features = np.load(features_path, mmap_mode='r')
+    shared_labels = np.load(labels_path, mmap_mode='r')
+
+
+def evaluate_fold(params, train_index, test_index, random_state):
+    """
+    Fit and score one parameter setting on one fold, inside a worker process.
+
+    Parameters:
+    params (dict): RandomForestClassifier parameters.
+    train_index (np.ndarray): Rows used for training.
+    test_index (np.ndarray): Rows used for testing.
+    random_state (int): Seed for the forest.
+
+    Returns:
+    dict: Test predictions, fit time and per-segment predict time.
+    """
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(shared_features[train_index], shared_labels[train_index])
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = model.predict(shared_features[test_index])
+    predict_seconds = time.perf_counter() - start
+    return {
+        'predictions': predictions,
+        'fit_seconds': fit_seconds,
+        'predict_ms_per_segment': predict_seconds * 1000 / max(1, len(test_index)),
+    }
+
+
+class CrossValidationRunner:
+    """
+    This class runs k-fold cross-validation over a small hyperparameter grid in parallel.
+    The cached features are written once to .npy files that every worker memory-maps, so the
+    feature matrix is shared between processes instead of being copied into each task.
+    """
+
+    def __init__(self, features, labels, folds=5, random_state=42, workers=None):
+        """
+        Initialize the runner.
+
+        Parameters:
+        features (np.ndarray): Feature matrix, one row per audio segment.
+        labels (np.ndarray): Chord label of each row.
+        folds (int): Number of cross-validation folds.
+        random_state (int): Seed for the fold split and the forests.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        """
+        self.class_names, self.encoded_labels = np.unique(labels, return_inverse=True)
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.folds = folds
+        self.random_state = random_state
+        self.workers = workers or os.cpu_count()
+
+    @classmethod
+    def from_cache(cls, cache_path, csv_path=None, **kwargs):
+        """
+        Build a runner from a ChordClassifier feature cache, extracting the features first if needed.
+
+        Parameters:
+        cache_path (str): Path to the .npz feature cache.
+        csv_path (str): Dataset CSV, only used when the cache does not exist yet.
+
+        Returns:
+        CrossValidationRunner: The runner.
+        """
+        features, labels = ChordClassifier(csv_path).load_data(cache_path)
+        return cls(features, labels, **kwargs)
+
+    def run(self, param_grid):
+        """
+        Evaluate every parameter setting of the grid on every fold.
+
+        Parameters:
+        param_grid (dict): Parameter name -> list of values.
+
+        Returns:
+        list: One result dict per setting with its mean and std accuracy, per-fold accuracies,
+              summed confusion matrix and mean fit/predict times.
+        """
+        names = sorted(param_grid)
+        settings = [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+        splitter = StratifiedKFold(n_splits=self.folds, shuffle=True, random_state=self.random_state)
+        splits = list(splitter.split(self.features, self.encoded_labels))
+
+        with tempfile.TemporaryDirectory() as shared_dir:
+            features_path = os.path.join(shared_dir, 'features.npy')
+            labels_path = os.path.join(shared_dir, 'labels.npy')
+            np.save(features_path, self.features)
+            np.save(labels_path, self.encoded_labels)
+
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=load_shared_features,
+                                     initargs=(features_path, labels_path)) as executor:
+                futures = {(setting_index, fold_index): executor.submit(evaluate_fold, setting, train_index,
+                                                                        test_index, self.random_state)
+                           for setting_index, setting in enumerate(settings)
+                           for fold_index, (train_index, test_index) in enumerate(splits)}
+                fold_results = {key: future.result() for key, future in futures.items()}
+
+        results = []
+        labels = np.arange(len(self.class_names))
+        for setting_index, setting in enumerate(settings):
+            matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+            accuracies, fit_times, predict_times = [], [], []
+            for fold_index, (_, test_index) in enumerate(splits):
+                fold = fold_results[(setting_index, fold_index)]
+                truth = self.encoded_labels[test_index]
+                matrix += confusion_matrix(truth, fold['predictions'], labels=labels)
+                accuracies.append(float(np.mean(truth == fold['predictions'])))
+                fit_times.append(fold['fit_seconds'])
+                predict_times.append(fold['predict_ms_per_segment'])
+            results.append({
+                'params': setting,
+                'accuracy_mean': float(np.mean(accuracies)),
+                'accuracy_std': float(np.std(accuracies)),
+                'fold_accuracies': accuracies,
+                'confusion_matrix': matrix,
+                'fit_seconds': float(np.mean(fit_times)),
+                'predict_ms_per_segment': float(np.mean(predict_times)),
+            })
+        return sorted(results, key=lambda result: -result['accuracy_mean'])
+
+    def format_confusion_matrix(self, matrix):
+        """Format a confusion matrix with true classes as rows and predicted classes as columns."""
+        width = max(6, max(len(name) for name in self.class_names) + 1)
+        lines = [" " * width + "".join(f"{name:>{width}}" for name in self.class_names)]
+        for name, row in zip(self.class_names, matrix):
+            lines.append(f"{name:>{width}}" + "".join(f"{count:>{width}}" for count in row))
+        return "\n".join(lines)
+
+    def report(self, results, show_matrices=1):
+        """
+        Print the results, best first.
+
+        Parameters:
+        results (list): Results from run.
+        show_matrices (int): Number of best settings whose confusion matrix and per-class recall are printed.
+        """
+        for rank, result in enumerate(results):
+            print(f"{result['params']}: accuracy {result['accuracy_mean']:.4f} +/- {result['accuracy_std']:.4f}, "
+                  f"fit {result['fit_seconds']:.2f}s, predict {result['predict_ms_per_segment']:.4f}ms/segment")
+            if rank < show_matrices:
+                matrix = result['confusion_matrix']
+                print(self.format_confusion_matrix(matrix))
+                recall = np.diag(matrix) / np.maximum(matrix.sum(axis=1), 1)
+                print("Recall: " + ", ".join(f"{name}={value:.2f}" for name, value in zip(self.class_names, recall)))
+
+
+def parse_grid_values(value):
+    """Parse a comma separated list of grid values, where 'none' means None."""
+    return [None if item.lower() == 'none' else int(item) for item in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate chord models in parallel on cached features.")
+    parser.add_argument('--features', required=True, help="Path to the .npz feature cache.")
+    parser.add_argument('--csv', help="Dataset CSV, used to build the feature cache if it does not exist.")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, help="Worker processes (default: all CPUs).")
+    parser.add_argument('--trees', type=parse_grid_values, default=[50, 100])
+    parser.add_argument('--depths', type=parse_grid_values, default=[None, 16])
+    parser.add_argument('--leaves', type=parse_grid_values, default=[1, 2])
+    parser.add_argument('--show-matrices', type=int, default=1)
+    args = parser.parse_args()
+
+    runner = CrossValidationRunner.from_cache(args.features, args.csv, folds=args.folds, workers=args.workers)
+    grid = {'n_estimators': args.trees, 'max_depth': args.depths, 'min_samples_leaf': args.leaves}
+    runner.report(runner.run(grid), args.show_matrices)
@@ -1,6 +1,11 @@
 from joblib import load
+from collections import OrderedDict
+import hashlib
+import os
+import threading
 import numpy as np
 import librosa
+from cache_eviction import evict_least_recently_used, mark_used
 
 
 class ChordIdentifier:
@@ -8,17 +13,35 @@ class ChordIdentifier:
     This class identifies chords in an audio file using a pre-trained machine learning model.
     """
 
-    def __init__(self, model_path, bpm):
+    def __init__(self, model_path, bpm, cache_size=8, cache_dir=None, hop_length=512, cache_max_bytes=None,
+                 logger=None):
         """
         Initialize the ChordIdentifier with a pre-trained model and beats per minute (BPM).
 
         Parameters:
         model_path (str): Path to the pre-trained model file.
         bpm (int): Beats per minute of the audio track.
+        cache_size (int): Number of tracks whose frame-level features are kept in memory.
+        cache_dir (str): Optional directory where the frame-level features are also stored on disk.
+        hop_length (int): Number of samples between spectrogram frames.
+        cache_max_bytes (int): Most bytes kept in cache_dir, evicting the least recently used tracks; None for no limit.
+        logger (StructuredLogger): Optional log for cache problems and evictions.
         """
         self.model = load(model_path)  # Load the pre-trained model
         self.bpm = bpm
-        self.segment_duration = (60 / bpm) * 4  # Duration of a 4/4 beat in seconds
+        self.segment_duration = self.bar_duration(bpm)
+        self.hop_length = hop_length
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.logger = logger
+        self.frame_cache = OrderedDict()  # track key -> (mel_db, sample_rate, num_samples)
+        self.cache_lock = threading.Lock()
+
+    @staticmethod
+    def bar_duration(bpm):
+        """Return the duration of a 4/4 bar in seconds."""
+        return (60 / bpm) * 4
 
     @staticmethod
     def extract_features(audio_segment, sample_rate):
@@ -41,38 +64,346 @@ class ChordIdentifier:
             return None
         return mfccs_processed
 
-    def predict_chord(self, audio_file):
+    def track_key(self, audio_file):
         """
-        Predict the chords in the given audio file.
+        Build a cache key that changes whenever the audio file changes.
 
         Parameters:
         audio_file (str): Path to the audio file.
 
         Returns:
-        list: List of tuples with predicted chords and their start times.
+        str: Hex digest of the path, size, modification time and feature settings.
+        """
+        stat = os.stat(audio_file)
+        # The trailing version invalidates frames cached before they held unfloored mel decibels
+        identity = f"{os.path.abspath(audio_file)}|{stat.st_size}|{stat.st_mtime_ns}|{self.hop_length}|3"
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    @staticmethod
+    def decode_audio(audio_file):
         """
-        audio, sample_rate = librosa.load(audio_file, res_type='kaiser_fast')  # Load the audio file
+        Decode an audio file.
 
-        total_duration = librosa.get_duration(y=audio, sr=sample_rate)  # Get total duration of the audio
-        segments = int(total_duration // self.segment_duration)  # Calculate the number of segments
+        Parameters:
+        audio_file (str): Path to the audio file.
 
-        chord_times = []  # List to store each chord and its appearance time
+        Returns:
+        tuple: The mono samples and their sample rate.
+        """
+        return librosa.load(audio_file, res_type='kaiser_fast')  # Load the audio file
+
+    def compute_frame_features(self, audio, sample_rate, cancel_token=None, chunk_frames=2048, n_fft=2048):
+        """
+        Compute the frame-level mel spectrogram of decoded audio, in decibels without a floor.
+        The spectrogram is computed in chunks so a cancellation token can stop long tracks early.
+        The track is padded once up front, so the frames are those of a single centred pass over
+        the track whatever chunk_frames is. The 80 dB floor of librosa.power_to_db is left to
+        bar_means, which applies it per bar as the training features do, so each chunk can be
+        converted to decibels as soon as it is computed.
+
+        Parameters:
+        audio (np.ndarray): The mono samples.
+        sample_rate (int): Sample rate of the audio.
+        cancel_token (CancellationToken): Optional token checked between chunks.
+        chunk_frames (int): Number of frames computed per chunk.
+        n_fft (int): FFT window size.
+
+        Returns:
+        tuple: Mel decibel frames (n_mels x frames), sample rate and number of samples.
+        """
+        padded = np.pad(audio, n_fft // 2)
+        num_frames = 1 + len(audio) // self.hop_length
+        chunks = []
+        for first_frame in range(0, num_frames, chunk_frames):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            last_frame = min(num_frames, first_frame + chunk_frames)
+            chunk = padded[first_frame * self.hop_length:(last_frame - 1) * self.hop_length + n_fft]
+            mel = librosa.feature.melspectrogram(y=chunk, sr=sample_rate, n_fft=n_fft, hop_length=self.hop_length,
+                                                 center=False)
+            chunks.append(librosa.power_to_db(mel, top_db=None).astype(np.float32))
+        return np.concatenate(chunks, axis=1), sample_rate, len(audio)
+
+    def cache_path(self, key):
+        """Return the disk cache file for a track key, or None without a cache directory."""
+        return os.path.join(self.cache_dir, key + '.npz') if self.cache_dir else None
+
+    def cached_frame_features(self, key):
+        """
+        Look up the frame-level features of a track in the memory cache, then in the disk cache.
+
+        Parameters:
+        key (str): The track key from track_key.
+
+        Returns:
+        tuple: Mel decibel frames, sample rate and number of samples, or None if the track is not cached.
+        """
+        cache_path = self.cache_path(key)
+        with self.cache_lock:
+            entry = self.frame_cache.get(key)
+            if entry is not None:
+                self.frame_cache.move_to_end(key)
+        if entry is not None:
+            if cache_path:
+                mark_used(cache_path)  # Keep the disk copy of a track in use from being evicted
+            return entry
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with np.load(cache_path, allow_pickle=False) as cache:
+                    entry = cache['mel_db'], int(cache['sample_rate']), int(cache['num_samples'])
+            except (OSError, ValueError, KeyError) as e:
+                if self.logger:
+                    self.logger.warning('feature_cache_unreadable', path=cache_path, error=str(e))
+                return None
+            mark_used(cache_path)
+            self.store_frame_features(key, entry, write_disk=False)
+            return entry
+        return None
+
+    def store_frame_features(self, key, entry, write_disk=True):
+        """
+        Add the frame-level features of a track to the memory cache and, optionally, the disk cache.
+
+        Parameters:
+        key (str): The track key from track_key.
+        entry (tuple): Mel decibel frames, sample rate and number of samples.
+        write_disk (bool): Also write the entry to the cache directory, if there is one.
+        """
+        cache_path = self.cache_path(key)
+        if write_disk and cache_path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # The temporary name must not end in .npz, or a concurrent eviction could delete it
+            temp_path = cache_path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as cache_file:
+                np.savez(cache_file, mel_db=entry[0], sample_rate=entry[1], num_samples=entry[2])
+            os.replace(temp_path, cache_path)
+            if self.cache_max_bytes is not None:
+                evicted = evict_least_recently_used(self.cache_dir, '.npz', max_bytes=self.cache_max_bytes)
+                if evicted and self.logger:
+                    self.logger.info('feature_cache_evicted', files=evicted)
+
+        with self.cache_lock:
+            self.frame_cache[key] = entry
+            self.frame_cache.move_to_end(key)
+            while len(self.frame_cache) > self.cache_size:
+                self.frame_cache.popitem(last=False)
+
+    def get_frame_features(self, audio_file, cancel_token=None):
+        """
+        Return the frame-level features of an audio file from the memory cache, the disk cache,
+        or by computing them.
+
+        Parameters:
+        audio_file (str): Path to the audio file.
+        cancel_token (CancellationToken): Optional token that stops the computation early.
+
+        Returns:
+        tuple: Mel decibel frames (n_mels x frames), sample rate and number of samples.
+        """
+        key = self.track_key(audio_file)
+        entry = self.cached_frame_features(key)
+        if entry is None:
+            audio, sample_rate = self.decode_audio(audio_file)
+            entry = self.compute_frame_features(audio, sample_rate, cancel_token)
+            self.store_frame_features(key, entry)
+        return entry
+
+    def bar_means(self, mel_db, start_times, sample_rate, segment_duration, top_db=80.0, n_fft=2048):
+        """
+        Compute the mean MFCCs of bars starting at the given times; a frame belongs to the bar its centre falls into.
+        Like librosa.feature.mfcc on the bar's own audio, which the model was trained on, every bar
+        floors its decibels top_db below its own loudest value before the DCT, so quiet bars, intros
+        and fades get the features of their own clip rather than ones clipped by the loudest part
+        of the track. The DCT is linear, so it is applied once to each bar's mean floored frame.
+
+        Parameters:
+        mel_db (np.ndarray): Unfloored mel decibel frames (n_mels x frames) from compute_frame_features.
+        start_times (np.ndarray): Start time of each bar in seconds, of any shape; bars may overlap.
+        sample_rate (int): Sample rate of the audio.
+        segment_duration (float): Duration of a bar in seconds.
+        top_db (float): Floor below each bar's loudest value, as in librosa.power_to_db.
+        n_fft (int): FFT window size the frames were computed with.
+
+        Returns:
+        tuple: Mean features (start_times.shape + (n_mfcc,)) and whether each bar contains any frame.
+        """
+        num_frames = mel_db.shape[1]
+        start_samples = (start_times * sample_rate).astype(np.int64)
+        end_samples = ((start_times + segment_duration) * sample_rate).astype(np.int64)
+        first_frames = np.minimum(-(-start_samples // self.hop_length), num_frames).ravel()
+        last_frames = np.minimum(-(-end_samples // self.hop_length), num_frames).ravel()
+        lengths = np.maximum(last_frames - first_frames, 0)
+        valid = lengths > 0
+        features = np.zeros((len(lengths), 40))
+        if valid.any():
+            # Gather the frames of every bar one after another, so overlapping bars each get their own copy
+            lengths, first_frames = lengths[valid], first_frames[valid]
+            bar_starts = np.cumsum(lengths) - lengths
+            frame_index = np.arange(lengths.sum()) - np.repeat(bar_starts - first_frames, lengths)
+            frames = mel_db[:, frame_index]
+            # Windows of the edge frames reach into the neighbouring bars, where a clip of the bar
+            # alone would see silence, so the bar's peak comes from its inner frames and caps the rest
+            position = np.arange(len(frame_index)) - np.repeat(bar_starts, lengths)
+            edge = n_fft // (2 * self.hop_length)
+            inner = (position >= edge) & (position < np.repeat(lengths, lengths) - edge)
+            frame_peaks = frames.max(axis=0)
+            peaks = np.maximum.reduceat(np.where(inner, frame_peaks, -np.inf), bar_starts)
+            peaks = np.where(np.isfinite(peaks), peaks, np.maximum.reduceat(frame_peaks, bar_starts))
+            frames = np.clip(frames, np.repeat(peaks - top_db, lengths), np.repeat(peaks, lengths))
+            means = np.add.reduceat(frames, bar_starts, axis=1, dtype=np.float64) / lengths
+            features[valid] = librosa.feature.mfcc(S=means, sr=sample_rate, n_mfcc=40).T
+        return features.reshape(start_times.shape + (40,)), valid.reshape(start_times.shape)
+
+    def segment_features(self, mel_db, sample_rate, num_samples, segment_duration, offset=0.0):
+        """
+        Compute the mean MFCCs of every bar, aggregating all bars at once.
+
+        Parameters:
+        mel_db (np.ndarray): Mel decibel frames (n_mels x frames).
+        sample_rate (int): Sample rate of the audio.
+        num_samples (int): Number of samples in the audio.
+        segment_duration (float): Duration of a bar in seconds.
+        offset (float): Start time of the first bar in seconds.
+
+        Returns:
+        tuple: Feature matrix (one row per bar) and the start time of each bar.
+        """
+        total_duration = num_samples / sample_rate
+        segments = max(0, int((total_duration - offset) // segment_duration))  # Calculate the number of segments
+        start_times = offset + np.arange(segments) * segment_duration
+        features, valid = self.bar_means(mel_db, start_times, sample_rate, segment_duration)
+        return features[valid], start_times[valid]
+
+    def find_bar_offset(self, mel_db, sample_rate, num_samples, segment_duration, max_bars=32, coarse_phases=16,
+                        min_bars=4):
+        """
+        Find the start of the first bar by scoring bar phases, one hop apart, within one bar.
+        The search runs coarse to fine: evenly spaced phases are scored first, then every phase
+        within one coarse step of the best one. Each phase is scored on the same bars, all of
+        them aggregated and classified in one predict_proba call per pass; the
+        phase whose bars are classified most confidently wins. Bars per phase shrink as the
+        number of phases grows, so the rows classified stay around the track's bar count.
+
+        Parameters:
+        mel_db (np.ndarray): Mel decibel frames (n_mels x frames).
+        sample_rate (int): Sample rate of the audio.
+        num_samples (int): Number of samples in the audio.
+        segment_duration (float): Duration of a bar in seconds.
+        max_bars (int): Most bars, spread evenly over the track, scored for every phase.
+        coarse_phases (int): Number of phases scored in the coarse pass.
+        min_bars (int): Fewest bars scored for every phase, however many phases there are.
+
+        Returns:
+        tuple: The best offset in seconds and the mean confidence of every candidate offset
+               (NaN for the phases the search skipped).
+        """
+        hop_seconds = self.hop_length / sample_rate
+        offsets = np.arange(0.0, segment_duration, hop_seconds)
+        scores = np.full(len(offsets), np.nan)
+        total_duration = num_samples / sample_rate
+        # Every phase gets the same bars, so only whole bars that fit after the latest phase are used
+        bars = int((total_duration - offsets[-1]) // segment_duration)
+        if bars <= 0:
+            return 0.0, np.zeros(len(offsets))
+        step = max(1, int(np.ceil(len(offsets) / coarse_phases)))
+        coarse = np.arange(0, len(offsets), step)
+        bars_per_phase = min(bars, max_bars, max(min_bars, bars // (len(coarse) + 2 * step - 2)))
+        bar_indices = np.unique(np.linspace(0, bars - 1, bars_per_phase).astype(np.int64))
+        scores[coarse] = self.score_offsets(mel_db, offsets[coarse], bar_indices, sample_rate,
+                                            segment_duration)
+        if step > 1:
+            # Phases wrap around the bar, so the neighbours of the first phase include the last ones
+            best = coarse[np.argmax(scores[coarse])]
+            fine = np.unique(np.arange(best - step + 1, best + step) % len(offsets))
+            fine = fine[np.isnan(scores[fine])]
+            scores[fine] = self.score_offsets(mel_db, offsets[fine], bar_indices, sample_rate,
+                                              segment_duration)
+        return float(offsets[np.nanargmax(scores)]), scores
+
+    def score_offsets(self, mel_db, offsets, bar_indices, sample_rate, segment_duration):
+        """
+        Score candidate bar phases by how confidently the model classifies their bars.
 
-        for segment in range(segments):
-            segment_start_time = segment * self.segment_duration
-            start_sample = int(segment_start_time * sample_rate)
-            end_sample = int((segment + 1) * self.segment_duration * sample_rate)
-            audio_segment = audio[start_sample:end_sample]
-
-            features = self.extract_features(audio_segment, sample_rate)
-            if features is not None:
-                features = np.array([features])
-                prediction = self.model.predict(features)[0]
-                if len(chord_times) == 0:
-                    chord_times.append((prediction, segment_start_time))  # Add chord and its start time
-                elif chord_times[-1][0] != prediction:
-                    chord_times.append((prediction, segment_start_time))  # Add chord and its start time
-            else:
-                print(f"Segment {segment + 1}: Could not process the audio segment.")
+        Parameters:
+        mel_db (np.ndarray): Mel decibel frames (n_mels x frames).
+        offsets (np.ndarray): Candidate offsets in seconds.
+        bar_indices (np.ndarray): Bars, counted from each offset, that are classified.
+        sample_rate (int): Sample rate of the audio.
+        segment_duration (float): Duration of a bar in seconds.
+
+        Returns:
+        np.ndarray: Mean confidence of every offset.
+        """
+        start_times = offsets[:, None] + bar_indices[None, :] * segment_duration
+        features, valid = self.bar_means(mel_db, start_times, sample_rate, segment_duration)
+        confidence = self.model.predict_proba(features.reshape(-1, features.shape[-1])).max(axis=1)
+        confidence = confidence.reshape(valid.shape) * valid
+        return confidence.sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
 
+    @staticmethod
+    def merge_predictions(predictions, start_times):
+        """
+        Collapse consecutive bars with the same chord.
+
+        Returns:
+        list: List of tuples with predicted chords and their start times.
+        """
+        chord_times = []  # List to store each chord and its appearance time
+        for prediction, segment_start_time in zip(predictions, start_times):
+            if len(chord_times) == 0 or chord_times[-1][0] != prediction:
+                chord_times.append((str(prediction), float(segment_start_time)))  # Add chord and its start time
         return chord_times
+
+    def predict_chord(self, audio_file, bpm=None, offset=0.0, cancel_token=None, batch_size=256):
+        """
+        Predict the chords in the given audio file.
+        Frame-level features are cached per track, so calling this again with another BPM or bar
+        offset only re-aggregates the frames and runs one batch prediction. With offset=None the
+        bar phase is detected first, which costs one more batch prediction.
+
+        Parameters:
+        audio_file (str): Path to the audio file.
+        bpm (int): Beats per minute, defaults to the BPM given at construction.
+        offset (float): Start time of the first bar in seconds, or None to detect it with find_bar_offset.
+        cancel_token (CancellationToken): Optional token checked between stages and segment batches;
+                                          raises JobCancelled once it is cancelled.
+        batch_size (int): Number of segments classified per predict call.
+
+        Returns:
+        list: List of tuples with predicted chords and their start times.
+        """
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        frames = self.get_frame_features(audio_file, cancel_token)
+        return self.classify(frames, bpm, offset, cancel_token, batch_size)
+
+    def classify(self, frames, bpm=None, offset=0.0, cancel_token=None, batch_size=256):
+        """
+        Segment frame-level features into bars and predict the chord of every bar.
+
+        Parameters:
+        frames (tuple): Mel decibel frames, sample rate and number of samples, as from get_frame_features.
+        bpm (int): Beats per minute, defaults to the BPM given at construction.
+        offset (float): Start time of the first bar in seconds, or None to detect it.
+        cancel_token (CancellationToken): Optional token checked between segment batches.
+        batch_size (int): Number of segments classified per predict call.
+
+        Returns:
+        list: List of tuples with predicted chords and their start times.
+        """
+        check_cancelled = cancel_token.raise_if_cancelled if cancel_token else (lambda: None)
+        check_cancelled()
+        segment_duration = self.bar_duration(bpm) if bpm else self.segment_duration
+        mel_db, sample_rate, num_samples = frames
+        if offset is None:
+            offset, _ = self.find_bar_offset(mel_db, sample_rate, num_samples, segment_duration)
+            check_cancelled()
+        features, start_times = self.segment_features(mel_db, sample_rate, num_samples, segment_duration, offset)
+        if len(features) == 0:
+            return []
+        predictions = []
+        for start in range(0, len(features), batch_size):
+            check_cancelled()
+            predictions.extend(self.model.predict(features[start:start + batch_size]))
+        return self.merge_predictions(predictions, start_times)
@@ -0,0 +1,233 @@
+import argparse
+import io
+import itertools
+import time
+import tracemalloc
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from joblib import dump, load
+from Create_module import ChordClassifier
+
+
+class ModelSizeOptimizer:
+    """
+    This class sweeps random forest sizes on cached chord features and reports the trade-off between
+    accuracy, inference latency, serialized size and memory, so the smallest adequate model can be shipped.
+    """
+
+    def __init__(self, features, labels, test_size=0.2, random_state=42, latency_samples=200):
+        """
+        Initialize the optimizer with a feature matrix and labels.
+
+        Parameters:
+        features (np.ndarray): Feature matrix, one row per audio segment.
+        labels (np.ndarray): Chord label of each row.
+        test_size (float): Fraction of the data held out for evaluation.
+        random_state (int): Seed used for the split and for every fitted forest.
+        latency_samples (int): Number of held-out rows timed one at a time.
+        """
+        self.random_state = random_state
+        self.latency_samples = latency_samples
+        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
+            features, labels, test_size=test_size, random_state=random_state)
+
+    @classmethod
+    def from_cache(cls, cache_path, csv_path=None, **kwargs):
+        """
+        Build an optimizer from a ChordClassifier feature cache, extracting the features first if needed.
+
+        Parameters:
+        cache_path (str): Path to the .npz feature cache.
+        csv_path (str): Dataset CSV, only used when the cache does not exist yet.
+
+        Returns:
+        ModelSizeOptimizer: The optimizer.
+        """
+        features, labels = ChordClassifier(csv_path).load_data(cache_path)
+        return cls(features, labels, **kwargs)
+
+    def build_model(self, n_estimators, max_depth, min_samples_leaf):
+        """
+        Create an unfitted forest for one sweep setting.
+
+        Returns:
+        RandomForestClassifier: The model.
+        """
+        return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                                      min_samples_leaf=min_samples_leaf, random_state=self.random_state)
+
+    def evaluate(self, n_estimators, max_depth, min_samples_leaf):
+        """
+        Fit one setting and measure it.
+
+        Parameters:
+        n_estimators (int): Number of trees.
+        max_depth (int): Maximum tree depth, or None for full depth.
+        min_samples_leaf (int): Minimum number of samples per leaf.
+
+        Returns:
+        dict: The setting together with accuracy, per-segment latency (ms), serialized size and
+              resident memory (bytes) of the loaded model.
+        """
+        model = self.build_model(n_estimators, max_depth, min_samples_leaf)
+        model.fit(self.X_train, self.y_train)
+        accuracy = accuracy_score(self.y_test, model.predict(self.X_test))
+
+        # The server predicts one segment at a time, so time single-row predictions
+        rows = self.X_test[:self.latency_samples]
+        timings = []
+        for i in range(len(rows)):
+            start = time.perf_counter()
+            model.predict(rows[i:i + 1])
+            timings.append(time.perf_counter() - start)
+
+        buffer = io.BytesIO()
+        dump(model, buffer)
+        size_bytes = buffer.tell()
+
+        # Memory held by the model once unpickled, as a worker would see it
+        buffer.seek(0)
+        tracemalloc.start()
+        loaded = load(buffer)
+        memory_bytes = tracemalloc.get_traced_memory()[0] + self.tree_array_bytes(loaded)
+        tracemalloc.stop()
+        del loaded
+
+        return {
+            'n_estimators': n_estimators,
+            'max_depth': max_depth,
+            'min_samples_leaf': min_samples_leaf,
+            'accuracy': accuracy,
+            'latency_ms': float(np.median(timings)) * 1000 if timings else 0.0,
+            'size_bytes': size_bytes,
+            'memory_bytes': memory_bytes,
+        }
+
+    @staticmethod
+    def tree_array_bytes(model):
+        """
+        Count the bytes of the tree node and value arrays, which sklearn allocates outside the
+        Python allocator and tracemalloc therefore does not see.
+
+        Parameters:
+        model (RandomForestClassifier): A fitted forest.
+
+        Returns:
+        int: Total size of the arrays in bytes.
+        """
+        total = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            total += tree.node_count * tree.__getstate__()['nodes'].itemsize + tree.value.nbytes
+        return total
+
+    def sweep(self, n_estimators_grid, max_depth_grid, min_samples_leaf_grid):
+        """
+        Evaluate every combination of the given grids.
+
+        Returns:
+        list: One result dict per setting (see evaluate).
+        """
+        results = []
+        for n_estimators, max_depth, min_samples_leaf in itertools.product(
+                n_estimators_grid, max_depth_grid, min_samples_leaf_grid):
+            result = self.evaluate(n_estimators, max_depth, min_samples_leaf)
+            print(f"Evaluated {self.describe(result)}")
+            results.append(result)
+        return results
+
+    @staticmethod
+    def pareto_frontier(results):
+        """
+        Keep the settings that no other setting beats on every metric at once
+        (higher accuracy, lower latency, smaller size and lower memory).
+
+        Parameters:
+        results (list): Result dicts from sweep.
+
+        Returns:
+        list: Non-dominated results sorted by serialized size.
+        """
+        def dominates(a, b):
+            no_worse = (a['accuracy'] >= b['accuracy'] and a['latency_ms'] <= b['latency_ms']
+                        and a['size_bytes'] <= b['size_bytes'] and a['memory_bytes'] <= b['memory_bytes'])
+            better = (a['accuracy'] > b['accuracy'] or a['latency_ms'] < b['latency_ms']
+                      or a['size_bytes'] < b['size_bytes'] or a['memory_bytes'] < b['memory_bytes'])
+            return no_worse and better
+
+        frontier = [r for r in results if not any(dominates(other, r) for other in results)]
+        return sorted(frontier, key=lambda r: r['size_bytes'])
+
+    @staticmethod
+    def select(results, min_accuracy):
+        """
+        Pick the smallest model that meets the accuracy bar.
+
+        Parameters:
+        results (list): Result dicts from sweep.
+        min_accuracy (float): Minimum held-out accuracy.
+
+        Returns:
+        dict: The chosen result, or None if no setting meets the bar.
+        """
+        candidates = [r for r in results if r['accuracy'] >= min_accuracy]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r['size_bytes'], r['latency_ms'], -r['accuracy']))
+
+    @staticmethod
+    def describe(result):
+        """Format a result dict as a single line."""
+        return (f"trees={result['n_estimators']} depth={result['max_depth']} leaf={result['min_samples_leaf']} "
+                f"accuracy={result['accuracy']:.4f} latency={result['latency_ms']:.3f}ms "
+                f"size={result['size_bytes'] / 1024:.1f}KiB memory={result['memory_bytes'] / 1024:.1f}KiB")
+
+    def print_frontier(self, results):
+        """Print the Pareto frontier of the given results."""
+        print("Pareto frontier:")
+        for result in self.pareto_frontier(results):
+            print("  " + self.describe(result))
+
+    def export(self, result, model_path):
+        """
+        Refit the chosen setting on all training data and save it.
+
+        Parameters:
+        result (dict): The chosen result.
+        model_path (str): Path to the file where the model will be saved.
+        """
+        model = self.build_model(result['n_estimators'], result['max_depth'], result['min_samples_leaf'])
+        model.fit(np.concatenate([self.X_train, self.X_test]), np.concatenate([self.y_train, self.y_test]))
+        dump(model, model_path)
+        print(f"Saved model to {model_path}")
+
+
+def parse_depth(value):
+    """Parse a max_depth grid entry, where 'none' means full depth."""
+    return None if value.lower() == 'none' else int(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep random forest sizes and export the smallest adequate model.")
+    parser.add_argument('--features', required=True, help="Path to the .npz feature cache.")
+    parser.add_argument('--csv', help="Dataset CSV, used to build the feature cache if it does not exist.")
+    parser.add_argument('--trees', type=int, nargs='+', default=[10, 25, 50, 100])
+    parser.add_argument('--depths', type=parse_depth, nargs='+', default=[8, 12, 16, None])
+    parser.add_argument('--leaves', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--min-accuracy', type=float, required=True, help="Accuracy bar the exported model must meet.")
+    parser.add_argument('--output', help="Where to save the chosen model.")
+    args = parser.parse_args()
+
+    optimizer = ModelSizeOptimizer.from_cache(args.features, args.csv)
+    sweep_results = optimizer.sweep(args.trees, args.depths, args.leaves)
+    optimizer.print_frontier(sweep_results)
+
+    chosen = optimizer.select(sweep_results, args.min_accuracy)
+    if chosen is None:
+        print(f"No setting reached an accuracy of {args.min_accuracy}.")
+    else:
+        print("Chosen: " + optimizer.describe(chosen))
+        if args.output:
+            optimizer.export(chosen, args.output)
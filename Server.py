@@ -2,11 +2,68 @@ import socket
 import threading
 import struct
 import sqlite3
+import wave
 import Identify_Chords
 import json
 import hashlib
+import os
+import time
+import signal
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from rsa import RSAEncryption
 from aes import AESEncryption
+from chord_transpose import capo_offset, transpose_timeline
+from chord_pipeline import RecognitionPipeline, parse_stage_workers
+from job_control import AdmissionController, AdmissionRejected, CancellationToken, JobCancelled
+import protocol
+from server_logging import StructuredLogger, parse_event_level
+from cache_eviction import evict_least_recently_used, mark_used
+
+
+class ClientSession:
+    """
+    This class holds the state of one client connection: its encryption, the settings it has sent,
+    and a lock that keeps replies from different worker threads from interleaving on the socket.
+    """
+
+    def __init__(self, client_socket, client_address):
+        """
+        Initialize the session for a newly accepted connection.
+
+        Parameters:
+        client_socket (socket): The client socket.
+        client_address (tuple): The client address.
+        """
+        self.client_socket = client_socket
+        self.client_address = client_address
+        self.aes = None
+        self.filepath = ""
+        self.bpm = 0
+        self.bar_offset = 0.0
+        self.capo_position = 0
+        self.transpose = 0
+        self.send_lock = threading.Lock()
+        self.current_job = None  # CancellationToken of the latest process request
+        self.closed = False
+
+    def start_job(self):
+        """
+        Cancel the session's running job, if any, and return a token for a new one.
+
+        Returns:
+        CancellationToken: The new job's token.
+        """
+        self.cancel_job()
+        self.current_job = CancellationToken()
+        return self.current_job
+
+    def cancel_job(self):
+        """Cancel the session's running job, if any."""
+        if self.current_job is not None:
+            self.current_job.cancel()
+            self.current_job = None
 
 
 class Server:
@@ -15,42 +72,81 @@ class Server:
     It manages client connections, user authentication, and audio processing.
     """
 
-    def __init__(self, host='localhost', port=65433):
+    def __init__(self, host='localhost', port=65433, feature_cache_dir=None, worker_threads=4,
+                 rsa_key_path=None, results_cache_dir=None, drain_timeout=30.0, max_jobs=8,
+                 max_queued_audio_seconds=3600.0, log_level='INFO', log_sample_rates=None, log_stream=None,
+                 log_event_levels=None, stage_workers=(2, 2, 1), results_cache_max_files=4096, feature_cache_max_bytes=2 * 1024 ** 3,
+                 db_path='user_db.db'):
         """
         Initialize the server with the given host and port.
 
         Parameters:
         host (str): Hostname or IP address to bind the server to.
         port (int): Port number to bind the server to.
+        feature_cache_dir (str): Optional directory for the on-disk frame-level MFCC cache.
+        worker_threads (int): Number of threads running audio processing jobs.
+        rsa_key_path (str): Optional private key file, so several processes present the same public key.
+        results_cache_dir (str): Optional directory for chord timelines shared between processes.
+        drain_timeout (float): Seconds to wait for open connections to finish when stopping.
+        max_jobs (int): Maximum number of audio processing jobs queued or running at once.
+        max_queued_audio_seconds (float): Maximum total audio duration of those jobs.
+        log_level (str): Minimum level of the structured log (per-message events are DEBUG).
+        log_sample_rates (dict): Event name -> N, logging only every Nth occurrence of that event.
+        log_event_levels (dict): Event name -> level, overriding the level the server logs that event at.
+        log_stream (file): Where to write the log, defaults to stdout.
+        stage_workers (tuple): Threads of the decode, feature and classify stages of the recognition pipeline.
+        results_cache_max_files (int): Most timelines kept in results_cache_dir; the least recently used go first.
+        feature_cache_max_bytes (int): Most bytes of frame-level features kept in feature_cache_dir, likewise.
+        db_path (str): SQLite user database, created if missing (e.g. a scratch copy for load tests).
         """
         self.host = host
         self.port = port
+        self.db_path = db_path
+        self.create_user_table()
         self.active_connections = 0
         self.lock = threading.Lock()
-        self.filepath = ""
-        self.bpm = 0
-        self.rsa = RSAEncryption()
-        self.aes_key = None
+        self.results_cache = OrderedDict()  # Untransposed chord timelines keyed by track, BPM and bar offset
+        self.results_cache_size = 128
+        self.cache_lock = threading.Lock()
+        self.rsa = self.load_rsa_key(rsa_key_path)
+        self.results_cache_dir = results_cache_dir
+        self.results_cache_max_files = results_cache_max_files
+        self.drain_timeout = drain_timeout
+        self.sessions = set()
+        self.stop_event = threading.Event()
         self.model_path = 'C:\\Users\\Amit Sibony\\Downloads\\trained_model2.joblib'
+        self.feature_cache_dir = feature_cache_dir
+        self.feature_cache_max_bytes = feature_cache_max_bytes
+        self.identifier = None  # Shared ChordIdentifier, loaded on first use
+        self.identifier_lock = threading.Lock()
+        self.stage_workers = stage_workers
+        self.pipeline = None  # RecognitionPipeline around the shared identifier, started on first use
+        self.job_executor = ThreadPoolExecutor(max_workers=worker_threads)
+        self.admission = AdmissionController(max_jobs, max_queued_audio_seconds)
+        self.logger = StructuredLogger(log_stream, log_level, event_levels=log_event_levels,
+                                       sample_rates=log_sample_rates)
+
+    def create_user_table(self):
+        """Create the users table if the database does not have one yet."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS users "
+                         "(username TEXT PRIMARY KEY, password TEXT, email TEXT, favorite_animal TEXT)")
+            conn.commit()
+        finally:
+            conn.close()
 
-    def recv_exactly(self, client_socket, n):
+    def load_rsa_key(self, rsa_key_path):
         """
-        Receive exactly n bytes from the client socket.
+        Load the key pair used in the key exchange, or generate one if no key file is given.
 
         Parameters:
-        client_socket (socket): The client socket.
-        n (int): The number of bytes to receive.
+        rsa_key_path (str): Optional private key file.
 
         Returns:
-        bytes: The received data.
+        RSAEncryption: The key pair.
         """
-        data = b''
-        while len(data) < n:
-            packet = client_socket.recv(n - len(data))
-            if not packet:
-                raise ConnectionError("Socket connection broken")
-            data += packet
-        return data
+        return RSAEncryption.from_key_file(rsa_key_path) if rsa_key_path else RSAEncryption()
 
     def handle_client_connection(self, client_socket, client_address):
         """
@@ -60,9 +156,11 @@ class Server:
         client_socket (socket): The client socket.
         client_address (tuple): The client address.
         """
+        session = ClientSession(client_socket, client_address)
         with self.lock:
             self.active_connections += 1
-            print(f"Accepted connection from {client_address}. Total connections: {self.active_connections}")
+            self.sessions.add(session)
+            self.logger.info('connection_accepted', client=client_address, connections=self.active_connections)
 
         try:
             # Send public key to client
@@ -70,101 +168,384 @@ class Server:
             client_socket.sendall(struct.pack('>I', len(public_key_pem)) + public_key_pem)
 
             # Receive AES key
-            aes_key_length_data = self.recv_exactly(client_socket, 4)
+            aes_key_length_data = protocol.recv_exactly(client_socket, 4)
             aes_key_length = struct.unpack('>I', aes_key_length_data)[0]
-            encrypted_aes_key = self.recv_exactly(client_socket, aes_key_length)
-            self.aes_key = self.rsa.decrypt(encrypted_aes_key)
-            self.aes = AESEncryption(self.aes_key)
+            encrypted_aes_key = protocol.recv_exactly(client_socket, aes_key_length)
+            session.aes = AESEncryption(self.rsa.decrypt(encrypted_aes_key))
 
             while True:
-                header = self.recv_exactly(client_socket, 8)
-                if not header:
-                    break
-
-                message_type, message_length = struct.unpack('>II', header)
-                encrypted_message = self.recv_exactly(client_socket, message_length)
-                message = self.aes.decrypt(encrypted_message).decode()
-                print(f"Received message of type {message_type} with length {message_length}: {message}")
-
-                if message_type == 0:
-                    self.handle_non_essential_message(message)
-                elif message_type == 1:
-                    self.handle_signup(client_socket, message)
-                elif message_type == 2:
-                    self.handle_signin(client_socket, message)
-                elif message_type == 3:
-                    self.handle_bpm_set(message)
-                elif message_type == 4:
-                    self.handle_open_file(message)
-                elif message_type == 5:
-                    self.handle_process_audio(client_socket)
-                elif message_type == 6:
+                message_type, request_id, encrypted_message = protocol.read_request(client_socket)
+                message = session.aes.decrypt(encrypted_message).decode()
+                if self.logger.enabled('message_received', 'DEBUG'):
+                    self.logger.debug('message_received', client=client_address, message_type=message_type,
+                                      length=len(encrypted_message), request_id=request_id,
+                                      **self.message_log_fields(message_type, message))
+                if not self.dispatch_message(session, message_type, request_id, message):
                     break
 
+        except ConnectionError:
+            pass  # The client went away
         finally:
+            # Stop any job of this client, there is nobody left to send its result to
+            session.closed = True
+            session.cancel_job()
             with self.lock:
                 self.active_connections -= 1
-                print(f"Connection from {client_address} has been closed. Total connections: {self.active_connections}")
+                self.sessions.discard(session)
+                self.logger.info('connection_closed', client=client_address, connections=self.active_connections)
             client_socket.close()
 
-    def handle_non_essential_message(self, message):
-        """Handle non-essential messages."""
-        print(f"Non-essential action: {message}")
+    def dispatch_message(self, session, message_type, request_id, message):
+        """
+        Pass a decrypted request to its handler.
 
-    def handle_signup(self, client_socket, message):
+        Parameters:
+        session (ClientSession): The client session.
+        message_type (int): One of the protocol.MSG_* types.
+        request_id (int): ID of a tagged request, or None.
+        message (str): The decrypted message.
+
+        Returns:
+        bool: False once the client has quit, True otherwise.
+        """
+        if message_type == protocol.MSG_NON_ESSENTIAL:
+            self.handle_non_essential_message(session, message)
+        elif message_type == protocol.MSG_SIGNUP:
+            self.handle_signup(session, message, request_id)
+        elif message_type == protocol.MSG_SIGNIN:
+            self.handle_signin(session, message, request_id)
+        elif message_type == protocol.MSG_SET_BPM:
+            self.handle_bpm_set(session, message)
+        elif message_type == protocol.MSG_OPEN_FILE:
+            self.handle_open_file(session, message)
+        elif message_type == protocol.MSG_PROCESS_AUDIO:
+            self.handle_process_audio(session, request_id)
+        elif message_type == protocol.MSG_QUIT:
+            return False
+        elif message_type == protocol.MSG_SET_TRANSPOSE:
+            self.handle_transpose_set(session, message)
+        elif message_type == protocol.MSG_STATS:
+            self.handle_stats(session, request_id)
+        elif message_type == protocol.MSG_METADATA:
+            self.handle_metadata(session, request_id)
+        return True
+
+    @staticmethod
+    def message_log_fields(message_type, message):
+        """
+        Split a request into log fields. Credentials get their own fields so the logger redacts them.
+
+        Parameters:
+        message_type (int): The message type.
+        message (str): The decrypted message.
+
+        Returns:
+        dict: Fields to log for the message.
+        """
+        if message_type == protocol.MSG_SIGNUP:
+            return dict(zip(('action', 'username', 'password', 'email', 'favorite_animal'), message.split(":", 4)))
+        if message_type == protocol.MSG_SIGNIN:
+            return dict(zip(('action', 'username', 'password'), message.split(":", 2)))
+        return {'message': message}
+
+    def send_response(self, session, request_id, response):
+        """
+        Encrypt and send a response, framed for a tagged or untagged request.
+
+        Parameters:
+        session (ClientSession): The client session.
+        request_id (int): ID of the request being answered, or None for an untagged request.
+        response (bytes): The plaintext response.
+        """
+        encrypted_response = session.aes.encrypt(response)
+        with session.send_lock:
+            session.client_socket.sendall(protocol.pack_response(encrypted_response, request_id))
+
+    def handle_non_essential_message(self, session, message):
+        """Handle non-essential messages; a reset also cancels the client's running job."""
+        self.logger.info('non_essential_action', client=session.client_address, message=message)
+        if message == "Reset":
+            session.cancel_job()
+
+    def handle_signup(self, session, message, request_id=None):
         """
         Handle user sign-up.
 
         Parameters:
-        client_socket (socket): The client socket.
+        session (ClientSession): The client session.
         message (str): The sign-up message.
+        request_id (int): ID of a tagged request, or None.
         """
         parts = message.split(":", 4)
         if len(parts) < 5:
-            response = self.aes.encrypt(b"Signup failed - Incomplete signup information")
-            client_socket.sendall(struct.pack('>I', len(response)) + response)
+            self.send_response(session, request_id, b"Signup failed - Incomplete signup information")
             return
         _, username, password, email, favorite_animal = parts
         if self.insert_user(username.strip(), password.strip(), email.strip(), favorite_animal.strip()):
-            response = self.aes.encrypt(b"Signup successful")
-            client_socket.sendall(struct.pack('>I', len(response)) + response)
+            self.send_response(session, request_id, b"Signup successful")
         else:
-            response = self.aes.encrypt(b"Signup failed - Username already exists")
-            client_socket.sendall(struct.pack('>I', len(response)) + response)
+            self.send_response(session, request_id, b"Signup failed - Username already exists")
 
-    def handle_signin(self, client_socket, message):
+    def handle_signin(self, session, message, request_id=None):
         """
         Handle user sign-in.
 
         Parameters:
-        client_socket (socket): The client socket.
+        session (ClientSession): The client session.
         message (str): The sign-in message.
+        request_id (int): ID of a tagged request, or None.
         """
         _, username, password = message.split(":")
         if self.validate_user(username.strip(), password.strip()):
-            response = self.aes.encrypt(b"Signin successful")
-            client_socket.sendall(struct.pack('>I', len(response)) + response)
+            self.send_response(session, request_id, b"Signin successful")
         else:
-            response = self.aes.encrypt(b"Signin failed - Invalid credentials")
-            client_socket.sendall(struct.pack('>I', len(response)) + response)
+            self.send_response(session, request_id, b"Signin failed - Invalid credentials")
+
+    def handle_bpm_set(self, session, message):
+        """
+        Handle setting BPM (beats per minute) or the start time of the first bar.
 
-    def handle_bpm_set(self, message):
-        """Handle setting BPM (beats per minute)."""
-        self.bpm = int(message.split(": ")[1])
+        Parameters:
+        session (ClientSession): The client session.
+        message (str): "BPM set to: <bpm>" or "Bar offset set to: <seconds>" ("auto" detects the first bar).
+        """
+        setting, value = message.split(": ")
+        if setting.startswith("Bar offset"):
+            session.bar_offset = None if value == "auto" else float(value)
+        else:
+            session.bpm = int(value)
 
-    def handle_open_file(self, message):
+    def handle_open_file(self, session, message):
         """Handle opening an audio file."""
-        self.filepath = message.split(": ")[1]
+        session.filepath = message.split(": ")[1]
 
-    def handle_process_audio(self, client_socket):
-        """Handle processing the audio file."""
-        print("Processing audio... Please wait.")
-        identifier = Identify_Chords.ChordIdentifier(self.model_path, self.bpm)
-        list_of_chords = identifier.predict_chord(self.filepath)
+    def handle_transpose_set(self, session, message):
+        """
+        Handle setting the capo position or a transposition.
+        The cached chord timelines are untouched; the offset is applied when chords are sent.
 
-        chords_json = json.dumps(list_of_chords)
-        encrypted_response = self.aes.encrypt(chords_json.encode())
-        client_socket.sendall(struct.pack('>I', len(encrypted_response)) + encrypted_response)
+        Parameters:
+        session (ClientSession): The client session.
+        message (str): "Capo set to: <fret>" or "Transpose set to: <semitones>".
+        """
+        setting, value = message.split(": ")
+        if setting.startswith("Capo"):
+            session.capo_position = int(value)
+        else:
+            session.transpose = int(value)
+
+    def handle_stats(self, session, request_id=None):
+        """Send server statistics as JSON."""
+        with self.cache_lock:
+            stats = {
+                'active_connections': self.active_connections,
+                'active_jobs': self.admission.active_jobs,
+                'queued_audio_seconds': self.admission.active_audio_seconds,
+                'cached_results': len(self.results_cache),
+                'cached_tracks': len(self.identifier.frame_cache) if self.identifier else 0,
+                'pipeline': self.pipeline.utilization() if self.pipeline else None,
+            }
+        self.send_response(session, request_id, json.dumps(stats).encode())
+
+    def handle_metadata(self, session, request_id=None):
+        """Send the duration and format of the session's audio file as JSON."""
+        try:
+            metadata = self.audio_info(session.filepath)
+        except (OSError, EOFError, wave.Error) as e:
+            metadata = {'error': f"Unable to read audio file: {e}"}
+        self.send_response(session, request_id, json.dumps(metadata).encode())
+
+    @staticmethod
+    def audio_info(filepath):
+        """
+        Read the duration and format of a WAV file from its header.
+
+        Parameters:
+        filepath (str): Path to the WAV file.
+
+        Returns:
+        dict: Duration in seconds, sample rate and number of channels.
+        """
+        with wave.open(filepath, 'rb') as wav_file:
+            return {
+                'duration': wav_file.getnframes() / wav_file.getframerate(),
+                'sample_rate': wav_file.getframerate(),
+                'channels': wav_file.getnchannels(),
+            }
+
+    def track_key(self, filepath, bpm, bar_offset):
+        """Return the results cache key for a file, BPM and bar offset."""
+        stat = os.stat(filepath)
+        return os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns, bpm, bar_offset
+
+    def get_identifier(self):
+        """
+        Return the shared ChordIdentifier, loading the model on first use.
+        Sharing it keeps the model loaded and lets its frame-level feature cache serve every client.
+        """
+        with self.identifier_lock:
+            if self.identifier is None:
+                self.identifier = Identify_Chords.ChordIdentifier(self.model_path, 120,
+                                                                  cache_dir=self.feature_cache_dir,
+                                                                  cache_max_bytes=self.feature_cache_max_bytes,
+                                                                  logger=self.logger)
+            return self.identifier
+
+    def get_pipeline(self):
+        """
+        Return the shared recognition pipeline, starting it on first use. Jobs of all clients go
+        through it, so one file is decoded while another is being classified.
+        """
+        identifier = self.get_identifier()
+        with self.identifier_lock:
+            if self.pipeline is None:
+                self.pipeline = RecognitionPipeline(identifier, *self.stage_workers)
+            return self.pipeline
+
+    def get_chords(self, filepath, bpm, bar_offset, cancel_token=None):
+        """
+        Return the untransposed chord timeline of a file, running the recognition only if it is
+        not cached yet.
+
+        Parameters:
+        filepath (str): Path to the audio file.
+        bpm (int): Beats per minute.
+        bar_offset (float): Start time of the first bar in seconds, or None to detect it.
+        cancel_token (CancellationToken): Optional token that stops the recognition early.
+
+        Returns:
+        list: List of (chord, start_time) pairs.
+        """
+        key = self.track_key(filepath, bpm, bar_offset)
+        with self.cache_lock:
+            if key in self.results_cache:
+                self.results_cache.move_to_end(key)
+                return self.results_cache[key]
+
+        list_of_chords = self.load_cached_result(key)
+        if list_of_chords is None:
+            self.logger.info('processing_audio', filepath=filepath, bpm=bpm, bar_offset=bar_offset)
+            list_of_chords = self.get_pipeline().submit(filepath, bpm, bar_offset, cancel_token).result()
+            self.save_cached_result(key, list_of_chords)
+
+        with self.cache_lock:
+            self.results_cache[key] = list_of_chords
+            if len(self.results_cache) > self.results_cache_size:
+                self.results_cache.popitem(last=False)
+        return list_of_chords
+
+    def result_cache_path(self, key):
+        """Return the file holding the cached chord timeline for a results cache key."""
+        return os.path.join(self.results_cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.json')
+
+    def load_cached_result(self, key):
+        """
+        Read a chord timeline from the shared results cache directory.
+
+        Returns:
+        list: The cached timeline, or None if it is not cached.
+        """
+        if not self.results_cache_dir:
+            return None
+        cache_path = self.result_cache_path(key)
+        try:
+            with open(cache_path) as cache_file:
+                list_of_chords = [tuple(pair) for pair in json.load(cache_file)]
+        except (OSError, ValueError):
+            return None
+        mark_used(cache_path)
+        return list_of_chords
+
+    def save_cached_result(self, key, list_of_chords):
+        """Write a chord timeline to the shared results cache directory, atomically."""
+        if not self.results_cache_dir:
+            return
+        os.makedirs(self.results_cache_dir, exist_ok=True)
+        cache_path = self.result_cache_path(key)
+        temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as cache_file:
+            json.dump(list_of_chords, cache_file)
+        os.replace(temp_path, cache_path)
+        evicted = evict_least_recently_used(self.results_cache_dir, '.json', max_files=self.results_cache_max_files)
+        if evicted:
+            self.logger.info('results_cache_evicted', files=evicted)
+
+    def handle_process_audio(self, session, request_id=None):
+        """
+        Handle processing the audio file.
+        The job runs on the worker pool so the connection keeps reading while it runs: a disconnect,
+        Quit or Reset cancels it right away, and tagged requests can be answered meanwhile. Untagged
+        (lock-step) clients still get their replies in order, as they wait for this one before sending
+        another request.
+
+        Parameters:
+        session (ClientSession): The client session.
+        request_id (int): ID of a tagged request, or None.
+        """
+        # Snapshot the settings so later messages on this connection do not affect this job
+        settings = (session.filepath, session.bpm, session.bar_offset,
+                    capo_offset(session.capo_position, session.transpose))
+        try:
+            ticket = self.admit_job(session.filepath, session.bpm, session.bar_offset)
+        except AdmissionRejected as e:
+            # The client's running job, if any, carries on, so a rejected request costs it nothing
+            self.logger.warning('job_rejected', client=session.client_address, reason=e.reason, detail=str(e))
+            self.send_response(session, request_id, json.dumps({'error': str(e), 'reason': e.reason}).encode())
+            return
+        # Once admitted, the new request supersedes the client's previous one
+        cancel_token = session.start_job()
+        self.job_executor.submit(self.process_audio, session, request_id, cancel_token, ticket, *settings)
+
+    def admit_job(self, filepath, bpm, bar_offset):
+        """
+        Pass a job through admission control unless its result is already cached in memory.
+
+        Returns:
+        AdmissionTicket: The job's ticket, or None if the job needs no admission.
+        """
+        try:
+            key = self.track_key(filepath, bpm, bar_offset)
+            audio_seconds = self.audio_info(filepath)['duration']
+        except (OSError, EOFError, wave.Error):
+            return None  # The job fails quickly on its own and reports the error
+        with self.cache_lock:
+            if key in self.results_cache:
+                return None
+        return self.admission.admit(audio_seconds)
+
+    def process_audio(self, session, request_id, cancel_token, ticket, filepath, bpm, bar_offset, semitones):
+        """
+        Recognize (or fetch from the cache) the chords of a file and send them to the client.
+
+        Parameters:
+        session (ClientSession): The client session.
+        request_id (int): ID of a tagged request, or None.
+        cancel_token (CancellationToken): Token that stops the job when the client goes away or moves on.
+        ticket (AdmissionTicket): The job's admission ticket, released when the job ends (None if not admitted).
+        filepath (str): Path to the audio file.
+        bpm (int): Beats per minute.
+        bar_offset (float): Start time of the first bar in seconds.
+        semitones (int): Transposition applied to the chord names.
+        """
+        try:
+            list_of_chords = transpose_timeline(self.get_chords(filepath, bpm, bar_offset, cancel_token), semitones)
+            response = json.dumps(list_of_chords)
+        except JobCancelled:
+            self.logger.info('job_cancelled', client=session.client_address, filepath=filepath)
+            response = json.dumps({'error': "Processing cancelled", 'reason': 'cancelled'})
+        except Exception as e:
+            self.logger.error('processing_failed', client=session.client_address, filepath=filepath, error=str(e))
+            response = json.dumps({'error': f"Unable to process audio: {e}"})
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+        if session.closed:
+            return
+        try:
+            self.send_response(session, request_id, response.encode())
+        except OSError as e:
+            self.logger.warning('send_failed', client=session.client_address, error=str(e))
 
     def validate_user(self, username, password):
         """
@@ -178,7 +559,7 @@ class Server:
         bool: True if the user credentials are valid, False otherwise.
         """
         hashed_password = hashlib.md5(password.encode()).hexdigest()
-        conn = sqlite3.connect('user_db.db')
+        conn = sqlite3.connect(self.db_path, timeout=10)
         c = conn.cursor()
         c.execute("SELECT * FROM users WHERE username=? AND password=?", (username, hashed_password))
         account = c.fetchone()
@@ -200,32 +581,106 @@ class Server:
         """
         hashed_password = hashlib.md5(password.encode()).hexdigest()
         try:
-            conn = sqlite3.connect('user_db.db')
+            conn = sqlite3.connect(self.db_path, timeout=10)
             c = conn.cursor()
             c.execute("INSERT INTO users (username, password, email, favorite_animal) VALUES (?, ?, ?, ?)",
                       (username, hashed_password, email, favorite_animal))
             conn.commit()
             return True
         except sqlite3.IntegrityError as e:
-            print(f"Error inserting new user: {e}")
+            self.logger.warning('signup_rejected', username=username, error=str(e))
             return False
         finally:
             conn.close()
 
-    def start(self):
-        """Start the server and listen for incoming connections."""
+    def start(self, reuse_port=False):
+        """
+        Start the server and listen for incoming connections until stop() is called.
+
+        Parameters:
+        reuse_port (bool): Set SO_REUSEPORT so several processes can accept on the same port.
+        """
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             server_socket.bind(("0.0.0.0", self.port))
             server_socket.listen()
-            print(f"Server listening for connections on {self.host}:{self.port}...")
-
-            while True:
-                client_socket, addr = server_socket.accept()
+            server_socket.settimeout(1.0)  # Wake up regularly to notice stop()
+            self.logger.info('server_listening', host=self.host, port=self.port, pid=os.getpid())
+
+            while not self.stop_event.is_set():
+                try:
+                    client_socket, addr = server_socket.accept()
+                except socket.timeout:
+                    continue
                 client_thread = threading.Thread(target=self.handle_client_connection, args=(client_socket, addr))
                 client_thread.start()
 
+        self.drain()
+
+    def stop(self):
+        """Stop accepting connections; start() then drains the open ones and returns."""
+        self.stop_event.set()
+
+    def drain(self):
+        """Wait for open connections to finish, closing any still open after the drain timeout."""
+        deadline = time.time() + self.drain_timeout
+        while self.active_connections and time.time() < deadline:
+            time.sleep(0.1)
+        with self.lock:
+            sessions = list(self.sessions)
+        for session in sessions:
+            session.cancel_job()
+            try:
+                session.client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.job_executor.shutdown(wait=True)
+        if self.pipeline:
+            self.pipeline.close()
+        self.logger.info('server_stopped', connections_closed=len(sessions))
+        self.logger.close()
+
 
 if __name__ == "__main__":
-    server = Server()
-    server.start()
+    parser = argparse.ArgumentParser(description="Chord recognition server.")
+    parser.add_argument('--port', type=int, default=65433)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of server processes sharing the port through SO_REUSEPORT.")
+    parser.add_argument('--db-path', default='user_db.db',
+                        help="User database (default: user_db.db); point load tests at a scratch file.")
+    parser.add_argument('--cache-dir', help="Directory for the feature and results caches shared by the workers.")
+    parser.add_argument('--feature-cache-max-mb', type=int, default=2048,
+                        help="Most megabytes of frame-level features kept in the cache directory (default: 2048).")
+    parser.add_argument('--results-cache-max-files', type=int, default=4096,
+                        help="Most chord timelines kept in the results cache directory (default: 4096).")
+    parser.add_argument('--rsa-key', help="Private key file shared by the workers (created if missing).")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--log-sample', action='append', default=[], metavar='EVENT=N',
+                        help="Log only every Nth occurrence of an event, e.g. message_received=100.")
+    parser.add_argument('--log-level-event', action='append', default=[], type=parse_event_level,
+                        metavar='EVENT=LEVEL', help="Log an event at another level, e.g. job_rejected=ERROR.")
+    parser.add_argument('--stage-workers', type=parse_stage_workers, default=(2, 2, 1),
+                        help="Threads of the decode, feature and classify stages (default: 2,2,1).")
+    args = parser.parse_args()
+
+    server_options = {'port': args.port, 'log_level': args.log_level, 'stage_workers': args.stage_workers,
+                      'results_cache_max_files': args.results_cache_max_files, 'db_path': args.db_path,
+                      'feature_cache_max_bytes': args.feature_cache_max_mb * 1024 ** 2,
+                      'log_event_levels': dict(args.log_level_event),
+                      'log_sample_rates': {event: int(rate) for event, rate in
+                                           (sample.split('=') for sample in args.log_sample)}}
+    if args.cache_dir:
+        server_options['feature_cache_dir'] = os.path.join(args.cache_dir, 'features')
+        server_options['results_cache_dir'] = os.path.join(args.cache_dir, 'results')
+
+    if args.workers > 1:
+        from server_supervisor import ServerSupervisor
+        ServerSupervisor(args.workers, server_options, args.rsa_key or 'server_key.pem').run()
+    else:
+        server = Server(rsa_key_path=args.rsa_key, **server_options)
+        # Ctrl-C drains like SIGTERM instead of raising KeyboardInterrupt out of start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: server.stop())
+        server.start()
@@ -0,0 +1,100 @@
+import argparse
+import itertools
+import os
+import tempfile
+import time
+import protocol
+from chord_backends import LocalBackend, NetworkBackend
+from load_test import percentile, write_synthetic_track
+
+
+class BackendBenchmark:
+    """
+    This class measures request latency through a chord backend, using exactly the requests the
+    player sends, so the local engine and the networked server can be compared directly.
+    """
+
+    def __init__(self, backend, audio_file, bpm=120, repeats=20):
+        """
+        Initialize the benchmark.
+
+        Parameters:
+        backend (NetworkBackend or LocalBackend): The backend to measure.
+        audio_file (str): WAV file whose chords are requested.
+        bpm (int): Beats per minute sent before processing.
+        repeats (int): Number of timed repetitions of the warm requests.
+        """
+        self.backend = backend
+        self.audio_file = audio_file
+        self.bpm = bpm
+        self.repeats = repeats
+        self.request_ids = itertools.count(1)
+
+    def request(self, message_type, message):
+        """Send a tagged request and wait for its reply; returns the latency in milliseconds."""
+        request_id = next(self.request_ids)
+        start = time.perf_counter()
+        self.backend.send(message_type, message, request_id)
+        while True:
+            reply_id, response = self.backend.receive()
+            if reply_id == request_id:
+                if response.startswith('{"error"'):
+                    raise RuntimeError(response)
+                return (time.perf_counter() - start) * 1000
+
+    def run(self):
+        """
+        Time the first request (which waits for the model to be ready), a cold chord request,
+        and repeated cached chord, stats and metadata requests.
+
+        Returns:
+        dict: Operation name -> list of latencies in milliseconds.
+        """
+        results = {'first_request': [self.request(protocol.MSG_STATS, "stats")]}
+        self.backend.send(protocol.MSG_OPEN_FILE, "Open file: " + os.path.abspath(self.audio_file))
+        self.backend.send(protocol.MSG_SET_BPM, f"BPM set to: {self.bpm}")
+        results['process_cold'] = [self.request(protocol.MSG_PROCESS_AUDIO, "process_audio")]
+        for operation, message_type in (('process_cached', protocol.MSG_PROCESS_AUDIO),
+                                        ('stats', protocol.MSG_STATS), ('metadata', protocol.MSG_METADATA)):
+            results[operation] = [self.request(message_type, operation) for _ in range(self.repeats)]
+        return results
+
+
+def report(name, results):
+    """Print the median and 95th percentile latency of every operation."""
+    print(name)
+    for operation, latencies in results.items():
+        latencies = sorted(latencies)
+        print(f"  {operation:<16} median {percentile(latencies, 0.5):9.2f}ms   p95 {percentile(latencies, 0.95):9.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chord request latency of the local engine and the server.")
+    parser.add_argument('--backends', default='local,network', help="Comma separated: local, network.")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=65433)
+    parser.add_argument('--model', help="Model for the local engine (defaults to the server's model).")
+    parser.add_argument('--audio', help="WAV file to process (default: a generated track).")
+    parser.add_argument('--track-seconds', type=float, default=180.0)
+    parser.add_argument('--bpm', type=int, default=120)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        audio_file = args.audio
+        if audio_file is None:
+            audio_file = os.path.join(work_dir, 'benchmark.wav')
+            write_synthetic_track(audio_file, args.track_seconds)
+        for name in args.backends.split(','):
+            start = time.perf_counter()
+            if name == 'local':
+                # A fresh cache directory, so the cold request really computes the features
+                backend = LocalBackend(args.model, os.path.join(work_dir, 'cache'))
+            else:
+                backend = NetworkBackend.connect(args.host, args.port)
+            setup_ms = (time.perf_counter() - start) * 1000
+            try:
+                results = BackendBenchmark(backend, audio_file, args.bpm, args.repeats).run()
+            finally:
+                backend.close()
+            report(f"{name} backend (setup {setup_ms:.1f}ms)", results)
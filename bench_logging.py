@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from server_logging import StructuredLogger
+
+
+class SlowStream:
+    """Wrap a stream so every write takes at least a given time, like a slow console or a pipe under load."""
+
+    def __init__(self, stream, write_latency):
+        self.stream = stream
+        self.write_latency = write_latency
+
+    def write(self, text):
+        time.sleep(self.write_latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_threads(threads, target):
+    """Run target(thread_index) on several threads at once and return the wall time in seconds."""
+    workers = [threading.Thread(target=target, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def bench_structured(stream, messages, threads, **logger_options):
+    """
+    Time the hot-path cost of StructuredLogger with several connection-like threads logging at once.
+
+    Returns:
+    tuple: (microseconds per message on the logging threads, seconds until the writer caught up, dropped count)
+    """
+    logger = StructuredLogger(stream, **logger_options)
+    dropped = []
+    original_format = logger.format_event
+
+    def count_drops(timestamp, event_level, event, fields):
+        if event == 'log_events_dropped':
+            dropped.append(fields['count'])
+        return original_format(timestamp, event_level, event, fields)
+
+    logger.format_event = count_drops
+    per_thread = messages // threads
+
+    def log_messages(thread_index):
+        client = ('127.0.0.1', 50000 + thread_index)
+        for request_id in range(per_thread):
+            logger.debug('message_received', client=client, message_type=2, length=48, request_id=request_id,
+                         action='signin', username='user', password='secret')
+
+    elapsed = run_threads(threads, log_messages)
+    start = time.perf_counter()
+    logger.close()
+    flush_seconds = time.perf_counter() - start
+    return elapsed * 1e6 / (per_thread * threads), flush_seconds, sum(dropped)
+
+
+def bench_print(stream, messages, threads):
+    """Time the old approach: formatting and printing every message synchronously on the connection thread."""
+    per_thread = messages // threads
+
+    def print_messages(thread_index):
+        client = ('127.0.0.1', 50000 + thread_index)
+        for request_id in range(per_thread):
+            print(f"Received message of type 2 with length 48 (request {request_id}) from {client}: "
+                  f"signin:user:secret", file=stream, flush=True)
+
+    return run_threads(threads, print_messages) * 1e6 / (per_thread * threads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the per-message overhead of the server's structured logging.")
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent logging threads, like client connections.")
+    parser.add_argument('--budget-us', type=float, default=10.0, help="Allowed hot-path cost per logged message.")
+    parser.add_argument('--output', default=os.devnull, help="Where log lines are written (default: discarded).")
+    parser.add_argument('--write-latency-us', type=float, default=0.0,
+                        help="Extra time every write to the output takes, to simulate a slow console.")
+    args = parser.parse_args()
+
+    with open(args.output, 'w') as output:
+        stream = SlowStream(output, args.write_latency_us / 1e6) if args.write_latency_us else output
+        print_us = bench_print(stream, args.messages, args.threads)
+        scenarios = [
+            ("logged", {'level': 'DEBUG'}),
+            ("sampled 1/100", {'level': 'DEBUG', 'sample_rates': {'message_received': 100}}),
+            ("filtered by level", {'level': 'INFO'}),
+        ]
+        results = [(name, *bench_structured(stream, args.messages, args.threads, **options))
+                   for name, options in scenarios]
+
+    print(f"{args.messages} messages on {args.threads} threads, budget {args.budget_us:.1f}us per message")
+    print(f"  synchronous print:   {print_us:8.2f}us per message")
+    for name, per_message_us, flush_seconds, dropped in results:
+        print(f"  {name + ':':<20} {per_message_us:8.2f}us per message, writer caught up {flush_seconds:.2f}s later, "
+              f"{dropped} dropped")
+
+    over_budget = [name for name, per_message_us, _, _ in results if per_message_us > args.budget_us]
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print("All scenarios within budget")
@@ -0,0 +1,50 @@
+import os
+
+
+def mark_used(cache_path):
+    """Touch a cache file after a hit, so evict_least_recently_used keeps it longer."""
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+
+
+def evict_least_recently_used(cache_dir, suffix, max_files=None, max_bytes=None):
+    """
+    Delete the least recently used files of a cache directory until it is within its bounds.
+    Several processes may share the directory and evict at the same time, so files that are
+    already gone are skipped.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    suffix (str): Suffix of the cache files; temporary files being written must not end with it.
+    max_files (int): Most files kept, or None for no limit.
+    max_bytes (int): Most bytes kept, or None for no limit.
+
+    Returns:
+    int: Number of files deleted.
+    """
+    entries = []
+    with os.scandir(cache_dir) as scan:
+        for entry in scan:
+            if entry.name.endswith(suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    entries.sort()
+    files = len(entries)
+    total_bytes = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if (max_files is None or files <= max_files) and (max_bytes is None or total_bytes <= max_bytes):
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        files -= 1
+        total_bytes -= size
+    return removed
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+from aes import AESEncryption
+from rsa import RSAEncryption
+import protocol
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.chords_cache')
+
+
+class NetworkBackend:
+    """
+    This class sends requests to the chord server over an encrypted socket.
+    Backends share one interface: send() a request (tagged with a request ID when a reply is
+    expected) and receive() the next (request_id, response) reply, blocking until one arrives.
+    """
+
+    def __init__(self, client_socket, aes):
+        """
+        Initialize the backend on a connected socket whose key exchange is done.
+
+        Parameters:
+        client_socket (socket): The connected socket.
+        aes (AESEncryption): The session's AES encryption.
+        """
+        self.client_socket = client_socket
+        self.aes = aes
+
+    @classmethod
+    def connect(cls, host='localhost', port=65433):
+        """
+        Connect to the server and exchange keys: the server sends its RSA public key and the
+        client answers with a fresh AES key encrypted with it.
+
+        Returns:
+        NetworkBackend: The connected backend.
+        """
+        client_socket = socket.create_connection((host, port))
+        public_key_length = struct.unpack('>I', protocol.recv_exactly(client_socket, 4))[0]
+        public_key_pem = protocol.recv_exactly(client_socket, public_key_length)
+        aes_key = os.urandom(32)
+        encrypted_aes_key = RSAEncryption().encrypt(aes_key, public_key_pem)
+        client_socket.sendall(struct.pack('>I', len(encrypted_aes_key)) + encrypted_aes_key)
+        return cls(client_socket, AESEncryption(aes_key))
+
+    def send(self, message_type, message, request_id=None):
+        """
+        Send a request.
+
+        Parameters:
+        message_type (int): One of the protocol.MSG_* types.
+        message (str): The message.
+        request_id (int): ID the reply is tagged with, or None for requests without a reply.
+        """
+        self.client_socket.sendall(protocol.pack_request(message_type, self.aes.encrypt(message.encode()), request_id))
+
+    def receive(self):
+        """
+        Wait for the next reply to a tagged request.
+
+        Returns:
+        tuple: The request ID and the decrypted response.
+        """
+        request_id, encrypted_response = protocol.read_tagged_response(self.client_socket)
+        return request_id, self.aes.decrypt(encrypted_response).decode()
+
+    def close(self):
+        """Close the connection."""
+        self.client_socket.close()
+
+
+def run_local_engine(requests, replies, model_path, cache_dir):
+    """Entry point of the local engine process; the server code is only imported there."""
+    from local_engine import LocalServer
+    LocalServer(replies, model_path, cache_dir).serve(requests)
+
+
+class LocalBackend:
+    """
+    This class runs the recognition pipeline in a background process of the client, with the same
+    interface as NetworkBackend. The process preloads the model when it starts and keeps a result
+    cache on disk, so a single user needs no server, and requests skip the socket and encryption.
+    """
+
+    def __init__(self, model_path=None, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Start the engine process.
+
+        Parameters:
+        model_path (str): Trained model to load, e.g. one exported by Optimize_model.py.
+        cache_dir (str): Directory for the feature and result caches.
+        """
+        self.requests = multiprocessing.Queue()
+        self.replies = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=run_local_engine, daemon=True,
+                                               args=(self.requests, self.replies, model_path, cache_dir))
+        self.process.start()
+
+    def send(self, message_type, message, request_id=None):
+        """
+        Send a request to the engine.
+
+        Parameters:
+        message_type (int): One of the protocol.MSG_* types.
+        message (str): The message.
+        request_id (int): ID the reply is tagged with, or None for requests without a reply.
+        """
+        self.requests.put((message_type, request_id, message))
+
+    def receive(self):
+        """
+        Wait for the next reply to a tagged request.
+
+        Returns:
+        tuple: The request ID and the response.
+        """
+        while True:
+            try:
+                return self.replies.get(timeout=1.0)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise ConnectionError(f"Local engine exited with code {self.process.exitcode}")
+
+    def close(self):
+        """Stop the engine process, letting it finish its running jobs first."""
+        if self.process.is_alive():
+            self.send(protocol.MSG_QUIT, "Quit")
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def create_backend(name=None, host='localhost', port=65433):
+    """
+    Create the backend selected by name or by the CHORDS_BACKEND environment variable
+    ('network', the default, or 'local'). The local backend reads its model path from
+    CHORDS_MODEL and its cache directory from CHORDS_CACHE_DIR.
+
+    Returns:
+    NetworkBackend or LocalBackend: The backend.
+    """
+    name = name or os.environ.get('CHORDS_BACKEND', 'network')
+    if name == 'local':
+        return LocalBackend(os.environ.get('CHORDS_MODEL'), os.environ.get('CHORDS_CACHE_DIR', DEFAULT_CACHE_DIR))
+    if name == 'network':
+        return NetworkBackend.connect(host, port)
+    raise ValueError(f"Unknown backend: {name}")
@@ -0,0 +1,218 @@
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class PipelineJob:
+    """One file travelling through the pipeline, with the intermediate results of each stage."""
+
+    def __init__(self, audio_file, bpm, offset, cancel_token):
+        self.audio_file = audio_file
+        self.bpm = bpm
+        self.offset = offset
+        self.cancel_token = cancel_token
+        self.future = Future()
+        self.key = None
+        self.audio = None
+        self.sample_rate = None
+        self.frames = None  # (mel decibel frames, sample rate, number of samples)
+
+
+class PipelineStage:
+    """
+    This class runs one stage of the pipeline on its own threads. Each thread takes a job from the
+    stage's input queue, does the stage's work and hands the job to the next stage's bounded queue,
+    blocking while that queue is full. Busy and blocked time are recorded for tuning the stage sizes.
+    """
+
+    def __init__(self, name, work, workers, input_queue, output_queue=None):
+        """
+        Initialize the stage and start its threads.
+
+        Parameters:
+        name (str): Stage name used in the statistics.
+        work (callable): work(job), run for every job; exceptions fail the job.
+        workers (int): Number of threads.
+        input_queue (queue.Queue): Jobs for this stage; None stops one thread.
+        output_queue (queue.Queue): Next stage's queue, or None for the last stage.
+        """
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.jobs = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run, name=f"pipeline-{name}-{index}", daemon=True)
+                        for index in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        """Thread body: process jobs until a None sentinel arrives."""
+        while True:
+            job = self.input_queue.get()
+            if job is None:
+                return
+            start = time.perf_counter()
+            try:
+                if job.cancel_token:
+                    job.cancel_token.raise_if_cancelled()
+                self.work(job)
+                forward = self.output_queue is not None
+            except Exception as e:
+                job.audio = job.frames = None
+                job.future.set_exception(e)
+                forward = False
+            finished = time.perf_counter()
+            if forward:
+                self.output_queue.put(job)
+            with self.lock:
+                self.jobs += 1
+                self.busy_seconds += finished - start
+                self.blocked_seconds += time.perf_counter() - finished
+
+    def stop(self):
+        """Stop the threads once the jobs already queued have been processed."""
+        for _ in self.threads:
+            self.input_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class RecognitionPipeline:
+    """
+    This class recognizes chords with decode, feature and classify stages running concurrently,
+    so one file is read and decoded while the frames of another are computed and a third is
+    classified. Bounded queues between the stages hold at most a few decoded tracks (double
+    buffering), which keeps memory flat when files arrive faster than they can be processed.
+    Tracks whose frames are cached skip straight through the decode and feature stages.
+    """
+
+    def __init__(self, identifier, decode_workers=2, feature_workers=2, classify_workers=1, queue_size=2):
+        """
+        Initialize the pipeline and start its stages.
+
+        Parameters:
+        identifier (ChordIdentifier): Provides the decoding, features, frame cache and model.
+        decode_workers (int): Threads reading and decoding audio files.
+        feature_workers (int): Threads computing frame-level mel spectrograms.
+        classify_workers (int): Threads segmenting the frames and running the model.
+        queue_size (int): Capacity of the queues between stages.
+        """
+        self.identifier = identifier
+        self.started = time.perf_counter()
+        self.decode_queue = queue.Queue()  # Unbounded, so submitting never blocks the caller
+        self.feature_queue = queue.Queue(maxsize=queue_size)
+        self.classify_queue = queue.Queue(maxsize=queue_size)
+        self.stages = [
+            PipelineStage('decode', self.decode, decode_workers, self.decode_queue, self.feature_queue),
+            PipelineStage('features', self.compute_features, feature_workers, self.feature_queue, self.classify_queue),
+            PipelineStage('classify', self.classify, classify_workers, self.classify_queue),
+        ]
+
+    def submit(self, audio_file, bpm=None, offset=0.0, cancel_token=None):
+        """
+        Queue a file for recognition.
+
+        Parameters:
+        audio_file (str): Path to the audio file.
+        bpm (int): Beats per minute, defaults to the identifier's BPM.
+        offset (float): Start time of the first bar in seconds, or None to detect it.
+        cancel_token (CancellationToken): Optional token; every stage checks it before working on the job.
+
+        Returns:
+        concurrent.futures.Future: Resolves to the list of (chord, start_time) pairs.
+        """
+        job = PipelineJob(audio_file, bpm, offset, cancel_token)
+        self.decode_queue.put(job)
+        return job.future
+
+    def decode(self, job):
+        """Decode stage: use the cached frames if there are any, otherwise read and decode the file."""
+        job.key = self.identifier.track_key(job.audio_file)
+        job.frames = self.identifier.cached_frame_features(job.key)
+        if job.frames is None:
+            job.audio, job.sample_rate = self.identifier.decode_audio(job.audio_file)
+
+    def compute_features(self, job):
+        """Feature stage: compute and cache the frame-level features of a decoded file."""
+        if job.frames is None:
+            job.frames = self.identifier.compute_frame_features(job.audio, job.sample_rate, job.cancel_token)
+            job.audio = None  # Release the decoded samples before waiting on the classify queue
+            self.identifier.store_frame_features(job.key, job.frames)
+
+    def classify(self, job):
+        """Classify stage: segment the frames into bars and predict their chords."""
+        result = self.identifier.classify(job.frames, job.bpm, job.offset, job.cancel_token)
+        job.frames = None
+        job.future.set_result(result)
+
+    def utilization(self):
+        """
+        Report how busy each stage has been since the pipeline started.
+
+        Returns:
+        dict: Stage name -> jobs processed, busy share and share blocked on a full downstream queue,
+              both relative to the stage's threads times the elapsed time.
+        """
+        elapsed = time.perf_counter() - self.started
+        report = {}
+        for stage in self.stages:
+            with stage.lock:
+                capacity = max(elapsed * stage.workers, 1e-9)
+                report[stage.name] = {'workers': stage.workers, 'jobs': stage.jobs,
+                                      'busy': round(stage.busy_seconds / capacity, 3),
+                                      'blocked': round(stage.blocked_seconds / capacity, 3)}
+        return report
+
+    def close(self):
+        """Finish the queued jobs and stop the stages in order."""
+        for stage in self.stages:
+            stage.stop()
+
+
+def parse_stage_workers(value):
+    """Parse 'decode,features,classify' thread counts, e.g. '2,2,1'."""
+    workers = [int(item) for item in value.split(',')]
+    if len(workers) != 3 or min(workers) < 1:
+        raise argparse.ArgumentTypeError("expected three positive numbers: decode,features,classify")
+    return workers
+
+
+if __name__ == "__main__":
+    from Identify_Chords import ChordIdentifier
+
+    parser = argparse.ArgumentParser(description="Recognize several files through the staged pipeline and "
+                                                 "report the throughput and utilization of each stage.")
+    parser.add_argument('model', help="Trained model file.")
+    parser.add_argument('files', nargs='+', help="WAV files to process.")
+    parser.add_argument('--bpm', type=int, default=120)
+    parser.add_argument('--stage-workers', type=parse_stage_workers, default=[2, 2, 1],
+                        help="Threads of the decode, feature and classify stages (default: 2,2,1).")
+    parser.add_argument('--queue-size', type=int, default=2)
+    parser.add_argument('--sequential', action='store_true', help="Also time the files one after another.")
+    args = parser.parse_args()
+
+    identifier = ChordIdentifier(args.model, args.bpm, cache_size=0)  # No cache, so every file is decoded
+    identifier.predict_chord(args.files[0])  # Warm up, so neither timing pays for librosa's first-call setup
+    if args.sequential:
+        start = time.perf_counter()
+        for audio_file in args.files:
+            identifier.predict_chord(audio_file)
+        print(f"Sequential: {len(args.files)} files in {time.perf_counter() - start:.2f}s")
+
+    pipeline = RecognitionPipeline(identifier, *args.stage_workers, queue_size=args.queue_size)
+    start = time.perf_counter()
+    futures = [pipeline.submit(audio_file) for audio_file in args.files]
+    for future in futures:
+        future.result()
+    print(f"Pipelined:  {len(args.files)} files in {time.perf_counter() - start:.2f}s")
+    for name, stats in pipeline.utilization().items():
+        print(f"  {name:<9} {stats['workers']} threads, {stats['jobs']} jobs, busy {stats['busy']:.0%}, "
+              f"blocked {stats['blocked']:.0%}")
+    pipeline.close()
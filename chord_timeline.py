@@ -0,0 +1,65 @@
+from bisect import bisect_right
+
+
+class ChordTimeline:
+    """
+    This class stores a chord timeline as sorted start-time arrays so that the chord playing at any
+    position, and the time of the next chord change, can be found with a binary search.
+    """
+
+    def __init__(self, chords_timeline=None):
+        """
+        Initialize the timeline from a list of (chord, start_time) pairs as sent by the server.
+
+        Parameters:
+        chords_timeline (list): List of (chord, start_time) pairs, in any order.
+        """
+        pairs = sorted(chords_timeline or [], key=lambda pair: pair[1])
+        self.chords = [chord for chord, _ in pairs]
+        self.start_times = [float(start_time) for _, start_time in pairs]
+
+    def __len__(self):
+        return len(self.chords)
+
+    def __iter__(self):
+        return iter(zip(self.chords, self.start_times))
+
+    def index_at(self, position):
+        """
+        Find the index of the chord playing at the given position.
+
+        Parameters:
+        position (float): Playback position in seconds.
+
+        Returns:
+        int: Index into the timeline, or -1 if the position is before the first chord.
+        """
+        return bisect_right(self.start_times, position) - 1
+
+    def chords_at(self, position):
+        """
+        Find the current and next chord at the given position.
+
+        Parameters:
+        position (float): Playback position in seconds.
+
+        Returns:
+        tuple: The current and next chord names, "N/A" where there is none.
+        """
+        index = self.index_at(position)
+        current_chord = self.chords[index] if index >= 0 else "N/A"
+        next_chord = self.chords[index + 1] if index + 1 < len(self.chords) else "N/A"
+        return current_chord, next_chord
+
+    def next_change_after(self, position):
+        """
+        Find when the chord changes next.
+
+        Parameters:
+        position (float): Playback position in seconds.
+
+        Returns:
+        float: Start time of the next chord, or None if no chord follows.
+        """
+        index = self.index_at(position) + 1
+        return self.start_times[index] if index < len(self.start_times) else None
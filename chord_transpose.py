@@ -0,0 +1,83 @@
+import re
+
+SHARP_NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+FLAT_NOTES = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
+NOTE_INDEX = {**{note: i for i, note in enumerate(SHARP_NOTES)}, **{note: i for i, note in enumerate(FLAT_NOTES)},
+              'Cb': 11, 'B#': 0, 'Fb': 4, 'E#': 5}
+CHORD_PATTERN = re.compile(r'^([A-G][#b]?)(.*?)(?:/([A-G][#b]?))?$')
+
+
+def transpose_note(note, semitones, use_flats=False):
+    """
+    Transpose a single note name.
+
+    Parameters:
+    note (str): Note name such as 'A', 'F#' or 'Bb'.
+    semitones (int): Number of semitones to move up (negative moves down).
+    use_flats (bool): Spell the result with flats instead of sharps.
+
+    Returns:
+    str: The transposed note name.
+    """
+    names = FLAT_NOTES if use_flats else SHARP_NOTES
+    return names[(NOTE_INDEX[note] + semitones) % 12]
+
+
+def transpose_chord(chord, semitones):
+    """
+    Transpose a chord label such as 'Am', 'F#7', 'Bdim' or 'C/G'. Labels that are not chords
+    (for example 'N/A') are returned unchanged.
+
+    Parameters:
+    chord (str): The chord label.
+    semitones (int): Number of semitones to move up (negative moves down).
+
+    Returns:
+    str: The transposed chord label.
+    """
+    match = CHORD_PATTERN.match(chord)
+    if not match or semitones % 12 == 0:
+        return chord
+    root, quality, bass = match.groups()
+    use_flats = root.endswith('b')
+    transposed = transpose_note(root, semitones, use_flats) + quality
+    if bass:
+        transposed += '/' + transpose_note(bass, semitones, bass.endswith('b'))
+    return transposed
+
+
+def capo_offset(capo_position, transpose=0):
+    """
+    Compute the semitone offset to apply to sounding chords.
+    With a capo on fret n the player fingers shapes n semitones below the sounding chords.
+
+    Parameters:
+    capo_position (int): Capo fret (0 for no capo).
+    transpose (int): Additional transposition in semitones.
+
+    Returns:
+    int: The semitone offset.
+    """
+    return transpose - capo_position
+
+
+def transpose_timeline(chords_timeline, semitones):
+    """
+    Transpose every chord of a timeline.
+
+    Parameters:
+    chords_timeline (list): List of (chord, start_time) pairs.
+    semitones (int): Number of semitones to move up (negative moves down).
+
+    Returns:
+    list: A new list of (chord, start_time) pairs.
+    """
+    if semitones % 12 == 0:
+        return list(chords_timeline)
+    mapping = {}
+    transposed = []
+    for chord, start_time in chords_timeline:
+        if chord not in mapping:
+            mapping[chord] = transpose_chord(chord, semitones)
+        transposed.append((mapping[chord], start_time))
+    return transposed
@@ -0,0 +1,116 @@
+import threading
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation token has been cancelled."""
+
+
+class AdmissionRejected(Exception):
+    """Raised when the server is too busy to accept another audio processing job."""
+
+    def __init__(self, message, reason):
+        """
+        Parameters:
+        message (str): Human readable explanation sent to the client.
+        reason (str): Machine readable reason ('too_many_jobs' or 'too_much_audio').
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    This class lets the connection thread cancel a job that runs elsewhere. The job polls the
+    token between units of work and stops by raising JobCancelled.
+    """
+
+    def __init__(self):
+        """Initialize a token that has not been cancelled."""
+        self.event = threading.Event()
+
+    def cancel(self):
+        """Ask the job to stop."""
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        """True once cancel() has been called."""
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        """Raise JobCancelled if the token has been cancelled."""
+        if self.event.is_set():
+            raise JobCancelled()
+
+
+class AdmissionTicket:
+    """
+    This class represents an admitted job. Releasing it (or leaving its with block) frees its
+    slot and audio budget in the AdmissionController.
+    """
+
+    def __init__(self, controller, audio_seconds):
+        self.controller = controller
+        self.audio_seconds = audio_seconds
+        self.released = False
+
+    def release(self):
+        """Give the job's slot and audio budget back; safe to call more than once."""
+        if not self.released:
+            self.released = True
+            self.controller.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class AdmissionController:
+    """
+    This class caps the number of audio processing jobs that are queued or running, and the total
+    seconds of audio they cover, rejecting new jobs instead of letting work pile up.
+    """
+
+    def __init__(self, max_jobs=8, max_audio_seconds=3600.0):
+        """
+        Initialize the controller.
+
+        Parameters:
+        max_jobs (int): Maximum number of queued or running jobs.
+        max_audio_seconds (float): Maximum total duration of the audio of those jobs.
+        """
+        self.max_jobs = max_jobs
+        self.max_audio_seconds = max_audio_seconds
+        self.active_jobs = 0
+        self.active_audio_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def admit(self, audio_seconds):
+        """
+        Admit a job or reject it.
+
+        Parameters:
+        audio_seconds (float): Duration of the audio the job will process.
+
+        Returns:
+        AdmissionTicket: The ticket to release when the job finishes.
+        """
+        with self.lock:
+            if self.active_jobs >= self.max_jobs:
+                raise AdmissionRejected(f"Server busy: {self.active_jobs} jobs already in progress, try again later",
+                                        'too_many_jobs')
+            # A single track longer than the budget is still accepted when no other job is running
+            if self.active_jobs and self.active_audio_seconds + audio_seconds > self.max_audio_seconds:
+                raise AdmissionRejected(f"Server busy: {self.active_audio_seconds:.0f}s of audio already queued, "
+                                        f"try again later", 'too_much_audio')
+            self.active_jobs += 1
+            self.active_audio_seconds += audio_seconds
+        return AdmissionTicket(self, audio_seconds)
+
+    def release(self, ticket):
+        """Free the slot and audio budget of a ticket (use AdmissionTicket.release instead)."""
+        with self.lock:
+            self.active_jobs -= 1
+            self.active_audio_seconds -= ticket.audio_seconds
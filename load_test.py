@@ -0,0 +1,410 @@
+import argparse
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import sqlite3
+import wave
+import numpy as np
+from rsa import RSAEncryption
+from aes import AESEncryption
+import protocol
+
+OPERATION_TYPES = {
+    'bpm': protocol.MSG_SET_BPM,
+    'open_file': protocol.MSG_OPEN_FILE,
+    'process': protocol.MSG_PROCESS_AUDIO,
+    'stats': protocol.MSG_STATS,
+    'metadata': protocol.MSG_METADATA,
+}
+SEND_ONLY_OPERATIONS = ('bpm', 'open_file')  # The server does not reply to these, so they have no latency
+NOTE_FREQUENCIES = [261.63, 293.66, 329.63, 349.23, 392.00, 440.00, 493.88]
+
+
+class RejectedResponse(ValueError):
+    """An error reply from the server, counted under its reason (e.g. 'too_many_jobs')."""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+def write_synthetic_track(path, duration, sample_rate=22050, bar_duration=2.0, seed=0):
+    """
+    Write a mono 16-bit WAV made of a random triad per bar, so the server has realistic work to do.
+
+    Parameters:
+    path (str): Where to write the file.
+    duration (float): Length of the track in seconds.
+    sample_rate (int): Sample rate of the track.
+    bar_duration (float): Length of each chord in seconds.
+    seed (int): Random seed for the chord sequence.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(bar_duration * sample_rate)) / sample_rate
+    bars = []
+    for _ in range(int(np.ceil(duration / bar_duration))):
+        root = rng.integers(len(NOTE_FREQUENCIES))
+        triad = [NOTE_FREQUENCIES[(root + step) % len(NOTE_FREQUENCIES)] for step in (0, 2, 4)]
+        bars.append(sum(np.sin(2 * np.pi * f * t) for f in triad) / 3)
+    audio = np.concatenate(bars)[:int(duration * sample_rate)]
+    audio += rng.normal(scale=0.01, size=len(audio))
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes((np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(np.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadTestStats:
+    """
+    This class collects per-operation latencies and errors from all simulated clients.
+    """
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.sent = {}
+        self.errors = {}
+        self.start_time = None
+        self.end_time = None
+
+    def record(self, operation, latency):
+        """Record a successful operation and its latency in seconds."""
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(latency)
+
+    def record_sent(self, operation):
+        """Record a request that was sent successfully but gets no reply."""
+        with self.lock:
+            self.sent[operation] = self.sent.get(operation, 0) + 1
+
+    def record_error(self, operation, error):
+        """Record a failed operation."""
+        with self.lock:
+            self.errors.setdefault(operation, {})
+            if isinstance(error, RejectedResponse):
+                key = error.reason
+            else:
+                key = type(error).__name__ if isinstance(error, Exception) else str(error)
+            self.errors[operation][key] = self.errors[operation].get(key, 0) + 1
+
+    def report(self):
+        """
+        Format throughput, latency percentiles and error rates per operation.
+
+        Returns:
+        str: The report.
+        """
+        elapsed = max(1e-9, (self.end_time or time.time()) - self.start_time)
+        lines = [f"{'operation':<12}{'ok':>8}{'errors':>8}{'err%':>7}{'ops/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+        total_ok = total_errors = 0
+        with self.lock:
+            for operation in sorted((set(self.latencies) | set(self.errors)) - set(SEND_ONLY_OPERATIONS)):
+                latencies = sorted(self.latencies.get(operation, []))
+                errors = sum(self.errors.get(operation, {}).values())
+                total_ok += len(latencies)
+                total_errors += errors
+                attempts = len(latencies) + errors
+                lines.append(f"{operation:<12}{len(latencies):>8}{errors:>8}{100 * errors / attempts:>6.1f}%"
+                             f"{len(latencies) / elapsed:>9.1f}{percentile(latencies, 0.50) * 1000:>10.1f}"
+                             f"{percentile(latencies, 0.95) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}")
+            for operation in SEND_ONLY_OPERATIONS:
+                count = self.sent.get(operation, 0)
+                errors = sum(self.errors.get(operation, {}).values())
+                if not count and not errors:
+                    continue
+                total_ok += count
+                total_errors += errors
+                lines.append(f"{operation:<12}{count:>8}{errors:>8}  sent without a reply, no latency measured")
+            for operation, kinds in sorted(self.errors.items()):
+                lines.append(f"  {operation} errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(kinds.items())))
+        lines.append(f"total: {total_ok} ok, {total_errors} errors in {elapsed:.1f}s ({total_ok / elapsed:.1f} ops/s)")
+        return "\n".join(lines)
+
+
+class SimulatedClient:
+    """
+    This class drives one connection through the real wire protocol: key exchange, sign-up,
+    sign-in and then a random mix of operations until the test ends.
+    """
+
+    def __init__(self, generator, client_index):
+        """
+        Initialize the client.
+
+        Parameters:
+        generator (LoadGenerator): The generator that owns this client.
+        client_index (int): Index used to build a unique username.
+        """
+        self.generator = generator
+        self.stats = generator.stats
+        self.client_index = client_index
+        self.rng = random.Random(client_index)
+        self.client_socket = None
+        self.aes = None
+
+    def send(self, message_type, message):
+        """Encrypt and send an untagged request."""
+        self.client_socket.sendall(protocol.pack_request(message_type, self.aes.encrypt(message.encode())))
+
+    def receive(self):
+        """Receive and decrypt a reply to an untagged request."""
+        response_length = struct.unpack('>I', protocol.recv_exactly(self.client_socket, 4))[0]
+        return self.aes.decrypt(protocol.recv_exactly(self.client_socket, response_length)).decode()
+
+    def timed(self, operation, action, has_reply=True):
+        """
+        Run an action, recording its latency (or, without a reply, only that it was sent) or its error.
+        After a socket error or timeout the connection is dropped: a late reply would otherwise be
+        read as the answer to the next request and skew every later measurement.
+
+        Parameters:
+        operation (str): Operation name used in the statistics.
+        action (callable): Sends the request and, if it has one, reads and checks the reply.
+        has_reply (bool): False for fire-and-forget requests, whose send time is not a latency.
+
+        Returns:
+        bool: True if the action succeeded.
+        """
+        start = time.perf_counter()
+        try:
+            action()
+        except OSError as e:
+            self.stats.record_error(operation, e)
+            self.disconnect()
+            return False
+        except ValueError as e:
+            self.stats.record_error(operation, e)
+            return False
+        if has_reply:
+            self.stats.record(operation, time.perf_counter() - start)
+        else:
+            self.stats.record_sent(operation)
+        return True
+
+    def disconnect(self):
+        """Close the connection, if open; the client reconnects before its next operation."""
+        if self.client_socket is not None:
+            self.client_socket.close()
+            self.client_socket = None
+
+    def connect(self):
+        """Connect and perform the RSA/AES key exchange."""
+        self.client_socket = socket.create_connection((self.generator.host, self.generator.port), timeout=self.generator.timeout)
+        public_key_length = struct.unpack('>I', protocol.recv_exactly(self.client_socket, 4))[0]
+        public_key_pem = protocol.recv_exactly(self.client_socket, public_key_length)
+        aes_key = os.urandom(32)
+        self.aes = AESEncryption(aes_key)
+        encrypted_aes_key = self.generator.rsa.encrypt(aes_key, public_key_pem)
+        self.client_socket.sendall(struct.pack('>I', len(encrypted_aes_key)) + encrypted_aes_key)
+
+    def authenticate(self):
+        """Sign up and sign in with a unique user."""
+        username = f"{self.generator.user_prefix}_{self.client_index}"
+        password = f"pw_{self.client_index}"
+
+        def signup():
+            self.send(protocol.MSG_SIGNUP, f"signup:{username}:{password}:{username}@example.com:cat")
+            response = self.receive()
+            if "successful" not in response and "already exists" not in response:
+                raise ValueError(response)
+
+        def signin():
+            self.send(protocol.MSG_SIGNIN, f"signin:{username}:{password}")
+            response = self.receive()
+            if "successful" not in response:
+                raise ValueError(response)
+
+        return self.timed('signup', signup) and self.timed('signin', signin)
+
+    def run_operation(self, operation):
+        """Run one operation of the mix."""
+        if operation == 'bpm':
+            self.timed(operation, lambda: self.send(protocol.MSG_SET_BPM, f"BPM set to: {self.rng.randint(60, 180)}"),
+                       has_reply=False)
+        elif operation == 'open_file':
+            track = self.rng.choice(self.generator.tracks)
+            self.timed(operation, lambda: self.send(protocol.MSG_OPEN_FILE, f"Open file: {track}"), has_reply=False)
+        else:
+            def request():
+                self.send(OPERATION_TYPES[operation], operation)
+                response = json.loads(self.receive())
+                if isinstance(response, dict) and 'error' in response:
+                    raise RejectedResponse(response['error'], response.get('reason', 'error'))
+            self.timed(operation, request)
+
+    def start_session(self):
+        """
+        Connect, sign in and send the settings every connection needs before it can process.
+
+        Returns:
+        bool: True if the session is ready.
+        """
+        if not self.timed('connect', self.connect) or not self.authenticate():
+            return False
+        self.run_operation('bpm')
+        self.run_operation('open_file')
+        return self.client_socket is not None
+
+    def run(self):
+        """Run the client until the generator stops, reconnecting after connection errors."""
+        operations, weights = zip(*self.generator.mix.items())
+        try:
+            while not self.generator.stop_event.is_set():
+                if self.client_socket is None and not self.start_session():
+                    if self.client_socket is not None:
+                        return  # Connected but the server refused the user; retrying would not help
+                    self.generator.stop_event.wait(1.0)  # Back off before reconnecting
+                    continue
+                self.run_operation(self.rng.choices(operations, weights)[0])
+                if self.generator.think_time:
+                    time.sleep(self.rng.expovariate(1 / self.generator.think_time))
+            if self.client_socket is not None:
+                self.send(protocol.MSG_QUIT, "Quit")
+        except OSError as e:
+            self.stats.record_error('connection', e)
+        finally:
+            self.disconnect()
+
+
+class LoadGenerator:
+    """
+    This class runs many SimulatedClients against one server, ramping them up over time,
+    and reports throughput, latency percentiles and error rates per operation.
+    Every client signs up an account, so each run adds clients rows to the server's user table;
+    run the server with --db-path pointing at a scratch database, or remove them with delete_test_users.
+    """
+
+    def __init__(self, host, port, clients, ramp, duration, mix, tracks, think_time=0.0, timeout=120.0,
+                 user_prefix=None):
+        """
+        Initialize the generator.
+
+        Parameters:
+        host (str): Server host.
+        port (int): Server port.
+        clients (int): Number of simulated clients.
+        ramp (float): Seconds over which the clients are started.
+        duration (float): Seconds to run after the last client has started.
+        mix (dict): Operation name -> relative weight.
+        tracks (list): Audio files the clients open (paths must be readable by the server).
+        think_time (float): Mean pause between operations of one client, in seconds.
+        timeout (float): Socket timeout in seconds.
+        user_prefix (str): Prefix of the usernames created by the test.
+        """
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.ramp = ramp
+        self.duration = duration
+        self.mix = mix
+        self.tracks = tracks
+        self.think_time = think_time
+        self.timeout = timeout
+        self.user_prefix = user_prefix or f"loadtest_{int(time.time())}"
+        self.rsa = RSAEncryption()  # Only its encrypt method is used, which takes the server's key
+        self.stats = LoadTestStats()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """
+        Start all clients, wait for the test to finish and return the statistics.
+
+        Returns:
+        LoadTestStats: The collected statistics.
+        """
+        threads = []
+        self.stats.start_time = time.time()
+        for client_index in range(self.clients):
+            thread = threading.Thread(target=SimulatedClient(self, client_index).run, daemon=True)
+            thread.start()
+            threads.append(thread)
+            if self.ramp and self.clients > 1:
+                time.sleep(self.ramp / (self.clients - 1))
+        time.sleep(self.duration)
+        self.stop_event.set()
+        for thread in threads:
+            thread.join(self.timeout)
+        self.stats.end_time = time.time()
+        return self.stats
+
+
+def delete_test_users(db_path, user_prefix):
+    """
+    Remove the accounts a load test signed up from a server's user database.
+
+    Parameters:
+    db_path (str): The server's SQLite user database.
+    user_prefix (str): The LoadGenerator's user_prefix.
+
+    Returns:
+    int: Number of accounts removed.
+    """
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        prefix = f"{user_prefix}_"
+        removed = conn.execute("DELETE FROM users WHERE substr(username, 1, ?) = ?", (len(prefix), prefix)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return removed
+
+
+def parse_mix(value):
+    """Parse an operation mix such as 'process=1,stats=3,bpm=2'."""
+    mix = {}
+    for item in value.split(','):
+        operation, weight = item.split('=')
+        if operation not in OPERATION_TYPES:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {operation}")
+        mix[operation] = float(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate load against a chord recognition server. Every "
+                                                 "client signs up a new account on the server, so run it with "
+                                                 "--db-path set to a scratch database or pass --cleanup-db.")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=65433)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--ramp', type=float, default=10.0, help="Seconds over which clients are started.")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run once all clients are started.")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('process=2,stats=3,metadata=3,bpm=1,open_file=1'))
+    parser.add_argument('--think-time', type=float, default=0.1, help="Mean pause between operations in seconds.")
+    parser.add_argument('--tracks', type=int, default=4, help="Number of synthetic tracks to generate.")
+    parser.add_argument('--track-seconds', type=float, default=60.0)
+    parser.add_argument('--audio-dir', default=os.path.abspath('load_test_audio'),
+                        help="Directory for the synthetic tracks; must be readable by the server.")
+    parser.add_argument('--cleanup-db', metavar='DB_PATH',
+                        help="The server's user database; the accounts signed up by this run are removed from it "
+                             "afterwards (the server must be local).")
+    args = parser.parse_args()
+
+    os.makedirs(args.audio_dir, exist_ok=True)
+    track_paths = []
+    for track_index in range(args.tracks):
+        track_path = os.path.join(args.audio_dir, f"synthetic_{track_index}_{int(args.track_seconds)}s.wav")
+        if not os.path.exists(track_path):
+            write_synthetic_track(track_path, args.track_seconds, seed=track_index)
+        track_paths.append(track_path)
+
+    generator = LoadGenerator(args.host, args.port, args.clients, args.ramp, args.duration, args.mix, track_paths,
+                              think_time=args.think_time)
+    print(f"Running {args.clients} clients against {args.host}:{args.port} as users {generator.user_prefix}_*")
+    print(generator.run().report())
+    if args.cleanup_db:
+        print(f"Removed {delete_test_users(args.cleanup_db, generator.user_prefix)} test accounts from {args.cleanup_db}")
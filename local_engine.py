@@ -0,0 +1,70 @@
+import json
+import os
+from Server import Server, ClientSession
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trained_model2.joblib')
+
+
+class LocalServer(Server):
+    """
+    This class runs the server's request handling inside a background process of the client.
+    Requests arrive on a queue instead of a socket and replies go back on another queue, so there
+    is no key exchange, encryption or framing, while settings, caching, cancellation and the reply
+    format stay exactly those of the networked server.
+    """
+
+    def __init__(self, replies, model_path=None, cache_dir=None, worker_threads=2):
+        """
+        Initialize the engine.
+
+        Parameters:
+        replies (multiprocessing.Queue): Queue receiving (request_id, response) pairs.
+        model_path (str): Trained model to load, defaults to trained_model2.joblib next to this file.
+        cache_dir (str): Optional directory for the frame-level MFCC and chord timeline caches, kept across runs.
+        worker_threads (int): Number of threads running audio processing.
+        """
+        super().__init__(worker_threads=worker_threads, log_level='WARNING',
+                         feature_cache_dir=os.path.join(cache_dir, 'features') if cache_dir else None,
+                         results_cache_dir=os.path.join(cache_dir, 'results') if cache_dir else None)
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        self.replies = replies
+
+    def load_rsa_key(self, rsa_key_path):
+        """Return no key: requests never cross a network, so there is no key exchange."""
+        return None
+
+    def send_response(self, session, request_id, response):
+        """Queue a response for the client process."""
+        self.replies.put((request_id, response.decode()))
+
+    def serve(self, requests):
+        """
+        Load the model, then handle requests until a quit message arrives. If the model cannot be
+        loaded the engine keeps serving, so every request that needs it gets an error reply.
+
+        Parameters:
+        requests (multiprocessing.Queue): Queue of (message_type, request_id, message) tuples.
+        """
+        session = ClientSession(None, 'local')
+        try:
+            try:
+                self.get_identifier()  # Preload the model so the first request does not wait for it
+            except Exception as e:
+                self.logger.error('model_load_failed', model_path=self.model_path, error=str(e))
+            while True:
+                message_type, request_id, message = requests.get()
+                try:
+                    if not self.dispatch_message(session, message_type, request_id, message):
+                        break
+                except Exception as e:
+                    self.logger.error('request_failed', message_type=message_type, error=str(e))
+                    if request_id is not None:
+                        self.send_response(session, request_id, json.dumps({'error': str(e)}).encode())
+        finally:
+            session.closed = True
+            session.cancel_job()
+            self.job_executor.shutdown(wait=True)
+            if self.pipeline:
+                self.pipeline.close()
+            self.logger.close()
+
@@ -1,13 +1,18 @@
-import socket
-import struct
 import json
 from tkinter import filedialog, simpledialog, messagebox
 import tkinter as tk
 import pygame
-import threading
+import math
 import time
-import os
-from aes import AESEncryption
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import protocol
+from chord_backends import NetworkBackend
+from chord_timeline import ChordTimeline
+from waveform_pyramid import load_or_build_pyramid
+from waveform_view import WaveformView
 
 class AudioPlayerApp(tk.Tk):
     """
@@ -15,16 +20,24 @@ class AudioPlayerApp(tk.Tk):
     It also handles encryption and communication with a server for various actions.
     """
 
-    def __init__(self, client_socket=None):
-        """Initialize the audio player application."""
+    def __init__(self, client_socket=None, aes=None, backend=None):
+        """
+        Initialize the audio player application.
+
+        Parameters:
+        client_socket (socket): A connected, authenticated socket to the server.
+        aes (AESEncryption): The encryption of that connection.
+        backend (NetworkBackend or LocalBackend): The backend to use instead of the socket.
+        """
         super().__init__()
         self.title("Audio Player with Tkinter")
-        self.geometry("500x600")
+        self.geometry("500x880")
         self.configure(bg='#282a36')
 
         # Initialize instance variables
         self.client_socket = client_socket
-        self.aes = None  # This will be set from AuthenticatedAudioPlayerApp
+        self.aes = aes  # May also be set later from AuthenticatedAudioPlayerApp
+        self.backend = backend
         self.file_path = None
         self.timer_running = False
         self.start_time = 0
@@ -32,17 +45,29 @@ class AudioPlayerApp(tk.Tk):
         self.playing = False
         self.paused = False
         self.bpm = None
+        self.bar_offset = 0.0
         self.capo_position = 0
+        self.transpose = 0
         self.current_chord = "N/A"
         self.next_chord = "N/A"
         self.pause_start_time = 0
         self.total_pause_duration = 0
-        self.chords_timeline = []
+        self.chords_timeline = ChordTimeline()
         self.audio_processed = False
-
-        # Initialize client socket if not provided
-        if self.client_socket is None:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.elapsed_time_job = None
+        self.chord_update_job = None
+        self.pyramid_executor = ThreadPoolExecutor(max_workers=1)
+        self.pyramid_future = None
+        self.pending_requests = {}  # request ID -> callback run on the Tk thread with the reply
+        self.request_ids = itertools.count(1)
+        self.reply_queue = queue.Queue()
+        self.receiver_thread = None
+        self.reply_job = None
+        self.chords_generation = 0  # Only the reply to the latest chords request is displayed
+        self.awaiting_processing = False
+
+        # Connect to the server if neither a socket nor a backend was provided
+        if self.client_socket is None and self.backend is None:
             self.connect_to_server()
 
         # Initialize pygame mixer for audio playback
@@ -67,9 +92,21 @@ class AudioPlayerApp(tk.Tk):
         self.bpm_button = tk.Button(self, text="Enter BPM", command=self.enter_bpm, bg='#6272a4', fg='white')
         self.bpm_button.pack(pady=10)
 
+        self.bar_offset_button = tk.Button(self, text="Bar Offset", command=self.enter_bar_offset, bg='#6272a4', fg='white')
+        self.bar_offset_button.pack(pady=10)
+
         self.capo_button = tk.Button(self, text="Select Capo", command=self.select_capo, bg='#6272a4', fg='white')
         self.capo_button.pack(pady=10)
 
+        self.transpose_button = tk.Button(self, text="Transpose", command=self.select_transpose, bg='#6272a4', fg='white')
+        self.transpose_button.pack(pady=10)
+
+        self.seek_button = tk.Button(self, text="Seek", command=self.seek_audio, bg='#6272a4', fg='white')
+        self.seek_button.pack(pady=10)
+
+        self.track_info_label = tk.Label(self, text="Track: N/A", bg='#282a36', fg='white')
+        self.track_info_label.pack(pady=5)
+
         self.elapsed_time_label = tk.Label(self, text="Elapsed Time: 0.00s", bg='#282a36', fg='white')
         self.elapsed_time_label.pack(pady=10)
 
@@ -88,61 +125,100 @@ class AudioPlayerApp(tk.Tk):
         self.process_button = tk.Button(self, text="Process", command=self.process_audio, bg='#6272a4', fg='white')
         self.process_button.pack(pady=10)
 
+        self.waveform_view = WaveformView(self)
+        self.waveform_view.pack(fill=tk.X, padx=10, pady=10)
+
     def connect_to_server(self):
         """
         Connect to the server and handle the encryption setup by exchanging keys.
         """
         try:
-            self.client_socket.connect(("localhost", 65433))
+            self.backend = NetworkBackend.connect("localhost", 65433)
+            self.client_socket, self.aes = self.backend.client_socket, self.backend.aes
             print("Connected to server")
-
-            # Receive public key length and key
-            public_key_length = struct.unpack('>I', self.recv_exactly(4))[0]
-            print(f"Received public key length: {public_key_length}")
-
-            public_key_pem = self.recv_exactly(public_key_length)
-            print("Received public key")
-
-            # Generate AES key and encrypt it with the server's public key
-            self.aes_key = os.urandom(32)
-            self.aes = AESEncryption(self.aes_key)
-            print("Generated AES key")
-
-            encrypted_aes_key = self.rsa.encrypt(self.aes_key, public_key_pem)
-            print("Encrypted AES key")
-
-            # Send the encrypted AES key to the server
-            self.client_socket.sendall(struct.pack('>I', len(encrypted_aes_key)) + encrypted_aes_key)
-            print("Sent encrypted AES key to server")
         except Exception as e:
             messagebox.showerror("Connection Error", f"Unable to connect to server: {e}")
             self.destroy()
 
-    def recv_exactly(self, n):
+    def get_backend(self):
         """
-        Receive exactly n bytes from the socket.
+        Return the backend requests go through, wrapping the authenticated socket on first use.
+
+        Returns:
+        NetworkBackend or LocalBackend: The backend, or None if the connection is not encrypted yet.
         """
-        data = b''
-        while len(data) < n:
-            packet = self.client_socket.recv(n - len(data))
-            if not packet:
-                raise ConnectionError("Socket connection broken")
-            data += packet
-        return data
+        if self.backend is None and self.client_socket is not None and self.aes is not None:
+            self.backend = NetworkBackend(self.client_socket, self.aes)
+        return self.backend
 
     def send_action_to_server(self, message_type, action):
         """
-        Encrypt and send an action message to the server.
+        Send an action message (one without a reply) to the server or the local engine.
         """
-        if self.aes is None:
+        backend = self.get_backend()
+        if backend is None:
             messagebox.showerror("Encryption Error", "AES encryption is not initialized.")
             print("AES encryption is not initialized.")
             return
-        action_encoded = self.aes.encrypt(action.encode())
-        header = struct.pack('>II', message_type, len(action_encoded))
-        self.client_socket.sendall(header + action_encoded)
+        backend.send(message_type, action)
         print(f"Sent action to server: {action}")
 
+    def send_request(self, message_type, action, callback):
+        """
+        Send a tagged request without waiting for the reply. The reply is matched by request ID
+        and passed to the callback on the Tk thread, so several requests can be in flight at once.
+
+        Parameters:
+        message_type (int): One of the protocol.MSG_* types that expects a reply.
+        action (str): The message.
+        callback (callable): Called with the decrypted reply.
+        """
+        backend = self.get_backend()
+        if backend is None:
+            messagebox.showerror("Encryption Error", "AES encryption is not initialized.")
+            print("AES encryption is not initialized.")
+            return
+        request_id = next(self.request_ids)
+        self.pending_requests[request_id] = callback
+        if self.receiver_thread is None:
+            self.receiver_thread = threading.Thread(target=self.receive_replies, daemon=True)
+            self.receiver_thread.start()
+        backend.send(message_type, action, request_id)
+        print(f"Sent request {request_id} to server: {action}")
+        if self.reply_job is None:
+            self.reply_job = self.after(20, self.dispatch_replies)
+
+    def receive_replies(self):
+        """Read replies to tagged requests in the background and queue them for the Tk thread."""
+        while True:
+            try:
+                self.reply_queue.put(self.backend.receive())
+            except (ConnectionError, OSError) as e:
+                self.reply_queue.put((None, e))
+                return
+
+    def dispatch_replies(self):
+        """Run the callbacks of received replies; keeps polling only while requests are pending."""
+        self.reply_job = None
+        while True:
+            try:
+                request_id, response = self.reply_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request_id is None:
+                # The receiver thread has exited; reset so the next request starts a new one
+                self.receiver_thread = None
+                self.pending_requests.clear()
+                self.awaiting_processing = False
+                self.process_button.config(state=tk.NORMAL)
+                messagebox.showerror("Connection Error", f"Lost connection to server: {response}")
+                return
+            callback = self.pending_requests.pop(request_id, None)
+            if callback:
+                callback(response)
+        if self.pending_requests:
+            self.reply_job = self.after(20, self.dispatch_replies)
+
     def send_non_essential_action(self, action):
         """Send a non-essential action message to the server."""
         self.send_action_to_server(0, action)  # Use message type 0 for non-essential actions
@@ -151,10 +227,47 @@ class AudioPlayerApp(tk.Tk):
         """Open a file dialog to select a WAV file and notify the server."""
         self.file_path = filedialog.askopenfilename(filetypes=[("WAV files", "*.wav")])
         if self.file_path:
-            if self.aes is None:
+            if self.get_backend() is None:
                 messagebox.showerror("Encryption Error", "AES encryption is not initialized.")
                 return
             self.send_action_to_server(4, "Open file: " + self.file_path)
+            self.send_request(protocol.MSG_METADATA, "metadata", self.on_metadata_received)
+            self.load_waveform(self.file_path)
+
+    def on_metadata_received(self, response):
+        """Show the duration and format of the opened file."""
+        metadata = json.loads(response)
+        if 'error' in metadata:
+            self.track_info_label.config(text="Track: N/A")
+            return
+        minutes, seconds = divmod(int(metadata['duration']), 60)
+        self.track_info_label.config(
+            text=f"Track: {minutes}:{seconds:02d} ({metadata['sample_rate']} Hz, {metadata['channels']} ch)")
+
+    def load_waveform(self, file_path):
+        """
+        Build (or load from the cache) the peak pyramid of the file in the background and show it
+        in the waveform view once it is ready.
+
+        Parameters:
+        file_path (str): Path to the WAV file.
+        """
+        self.waveform_view.clear()
+        self.pyramid_future = self.pyramid_executor.submit(load_or_build_pyramid, file_path)
+        self.check_waveform_ready(self.pyramid_future)
+
+    def check_waveform_ready(self, future):
+        """Poll the pyramid build from the Tk thread until it finishes."""
+        if future is not self.pyramid_future:
+            return  # A newer file was opened in the meantime
+        if not future.done():
+            self.after(50, self.check_waveform_ready, future)
+            return
+        try:
+            self.waveform_view.set_pyramid(future.result())
+            self.waveform_view.set_chords(self.chords_timeline)
+        except Exception as e:
+            print(f"Unable to build the waveform: {e}")
 
     def process_audio(self):
         """
@@ -164,19 +277,49 @@ class AudioPlayerApp(tk.Tk):
             messagebox.showinfo("Process Audio", "Please select a file and enter BPM first.")
             return
 
-        self.send_action_to_server(5, "process_audio")
+        self.process_button.config(state=tk.DISABLED)
+        self.awaiting_processing = True
+        self.request_chords()
 
-        data_length = struct.unpack('>I', self.recv_exactly(4))[0]
-        encrypted_response = self.recv_exactly(data_length)
-        response = self.aes.decrypt(encrypted_response).decode()
+    def request_chords(self):
+        """
+        Request the chord timeline of the current file from the server without blocking the UI.
+        The server caches results, so repeating the request after a capo change is cheap.
+        A new request makes the server cancel the previous one.
+        """
+        self.chords_generation += 1
+        generation = self.chords_generation
+        self.send_request(protocol.MSG_PROCESS_AUDIO, "process_audio",
+                          lambda response: self.on_chords_received(response, generation))
+        self.send_request(protocol.MSG_STATS, "stats", self.on_stats_received)
+
+    def on_chords_received(self, response, generation):
+        """Display a chord timeline received from the server."""
+        if generation != self.chords_generation:
+            return  # Superseded by a newer request or a reset
+        self.process_button.config(state=tk.NORMAL)
         try:
             list_of_chords = json.loads(response)
-            self.chords_timeline = list_of_chords
+        except json.JSONDecodeError:
+            messagebox.showerror("Process Audio", "Error decoding the processed chords.")
+            return
+        if isinstance(list_of_chords, dict):
+            if list_of_chords.get('reason') != 'cancelled':
+                messagebox.showerror("Process Audio", list_of_chords.get('error', "Unable to process audio."))
+            self.awaiting_processing = False
+            return
+        self.chords_timeline = ChordTimeline(list_of_chords)
+        self.waveform_view.set_chords(self.chords_timeline)
+        self.update_chord_display()
+        if self.awaiting_processing:
+            self.awaiting_processing = False
             self.audio_processed = True
             print("Audio processing completed")
             messagebox.showinfo("Process Audio", "Audio processing completed.")
-        except json.JSONDecodeError:
-            messagebox.showerror("Process Audio", "Error decoding the processed chords.")
+
+    def on_stats_received(self, response):
+        """Print the server statistics."""
+        print(f"Server stats: {response}")
 
     def toggle_audio(self):
         """Start, pause, or continue audio playback based on the current state."""
@@ -208,6 +351,7 @@ class AudioPlayerApp(tk.Tk):
             self.playing = False
             self.timer_running = False
             self.pause_start_time = time.time()
+            self.cancel_display_updates()
             self.send_non_essential_action("pause_audio")
 
     def continue_audio(self):
@@ -218,7 +362,7 @@ class AudioPlayerApp(tk.Tk):
             self.paused = False
             self.timer_running = True
             self.total_pause_duration += time.time() - self.pause_start_time
-            threading.Thread(target=self.update_elapsed_time, daemon=True).start()
+            self.schedule_display_updates()
             self.send_non_essential_action("Continue_audio")
 
     def restart_audio(self):
@@ -228,6 +372,36 @@ class AudioPlayerApp(tk.Tk):
             self.play_sound(self.file_path)
             self.send_non_essential_action("Restart_audio")
 
+    def seek_audio(self):
+        """Prompt the user for a position and continue playback from there."""
+        if not self.playing and not self.paused:
+            messagebox.showinfo("Seek", "Please start the audio first.")
+            return
+        position = simpledialog.askfloat("Seek", "Seek to (seconds):", minvalue=0)
+        if position is not None:
+            self.seek(position)
+
+    def seek(self, position):
+        """
+        Move playback to the given position and refresh the chord display.
+
+        Parameters:
+        position (float): Playback position in seconds.
+        """
+        pygame.mixer.music.play(start=position)
+        if self.paused:
+            pygame.mixer.music.pause()
+            self.pause_start_time = time.time()
+        self.start_time = time.time() - position
+        self.total_pause_duration = 0
+        self.elapsed_time = position
+        self.elapsed_time_label.config(text=f"Elapsed Time: {self.elapsed_time:.2f}s")
+        self.waveform_view.set_playhead(position)
+        self.update_chord_display()
+        if self.playing:
+            self.schedule_display_updates()
+        self.send_non_essential_action(f"Seek to: {position}")
+
     def enter_bpm(self):
         """Prompt the user to enter the BPM (beats per minute)."""
         bpm = simpledialog.askinteger("BPM", "Enter the BPM:", minvalue=1, maxvalue=300)
@@ -235,12 +409,43 @@ class AudioPlayerApp(tk.Tk):
             self.bpm = bpm
             self.send_action_to_server(3, f"BPM set to: {self.bpm}")
 
+    def enter_bar_offset(self):
+        """Prompt the user for the start time of the first bar (to skip a pickup or leading silence)."""
+        value = simpledialog.askstring("Bar Offset", "Start of the first bar in seconds, or 'auto' to detect it:",
+                                       initialvalue="auto" if self.bar_offset is None else str(self.bar_offset))
+        if value is None:
+            return
+        value = value.strip().lower()
+        if value == "auto":
+            self.bar_offset = None
+        else:
+            try:
+                bar_offset = float(value)
+            except ValueError:
+                bar_offset = -1
+            if bar_offset < 0:
+                messagebox.showerror("Bar Offset", "Enter a number of seconds (0 or more) or 'auto'.")
+                return
+            self.bar_offset = bar_offset
+        self.send_action_to_server(3, f"Bar offset set to: {'auto' if self.bar_offset is None else self.bar_offset}")
+
     def select_capo(self):
         """Prompt the user to select the capo position."""
         capo_position = simpledialog.askinteger("Capo Position", "Select Capo Position (0-11):", minvalue=0, maxvalue=11)
         if capo_position is not None:
             self.capo_position = capo_position
-            self.send_action_to_server(0, f"Capo position set to: {self.capo_position}")
+            self.send_action_to_server(7, f"Capo set to: {self.capo_position}")
+            if self.audio_processed:
+                self.request_chords()
+
+    def select_transpose(self):
+        """Prompt the user for a transposition in semitones."""
+        transpose = simpledialog.askinteger("Transpose", "Transpose by semitones (-11 to 11):", minvalue=-11, maxvalue=11)
+        if transpose is not None:
+            self.transpose = transpose
+            self.send_action_to_server(7, f"Transpose set to: {self.transpose}")
+            if self.audio_processed:
+                self.request_chords()
 
     def play_sound(self, file_path):
         """Load and play the sound file."""
@@ -249,23 +454,44 @@ class AudioPlayerApp(tk.Tk):
         self.playing = True
         self.paused = False
         self.start_time = time.time()
+        self.total_pause_duration = 0
         self.timer_running = True
-        threading.Thread(target=self.update_elapsed_time, daemon=True).start()
+        self.schedule_display_updates()
+
+    def current_position(self):
+        """Return the playback position in seconds."""
+        return time.time() - self.start_time - self.total_pause_duration
+
+    def schedule_display_updates(self):
+        """(Re)start the Tk timers that refresh the elapsed time and chord labels during playback."""
+        self.cancel_display_updates()
+        self.update_elapsed_time()
+        self.update_chord_display()
+
+    def cancel_display_updates(self):
+        """Cancel any pending display refresh."""
+        if self.elapsed_time_job is not None:
+            self.after_cancel(self.elapsed_time_job)
+            self.elapsed_time_job = None
+        if self.chord_update_job is not None:
+            self.after_cancel(self.chord_update_job)
+            self.chord_update_job = None
 
     def update_elapsed_time(self):
-        """Update the elapsed time and chord display while the audio is playing."""
-        while self.timer_running:
-            if self.playing:
-                current_time = time.time()
-                self.elapsed_time = current_time - self.start_time - self.total_pause_duration
-                elapsed_str = f"Elapsed Time: {self.elapsed_time:.2f}s"
-                self.elapsed_time_label.config(text=elapsed_str)
-                self.update_chord_display()
-            time.sleep(0.01)
+        """Update the elapsed time label, rescheduling itself while the audio is playing."""
+        self.elapsed_time_job = None
+        if not self.playing:
+            return
+        self.elapsed_time = self.current_position()
+        self.elapsed_time_label.config(text=f"Elapsed Time: {self.elapsed_time:.2f}s")
+        self.waveform_view.set_playhead(self.elapsed_time)
+        self.elapsed_time_job = self.after(100, self.update_elapsed_time)
 
     def quit_application(self):
         """Send quit action to the server and close the application."""
         self.send_action_to_server(6, "Quit")
+        if self.backend is not None:
+            self.backend.close()
         self.destroy()
 
     def reset_audio(self):
@@ -275,40 +501,46 @@ class AudioPlayerApp(tk.Tk):
         self.playing = False
         self.paused = False
         self.timer_running = False
+        self.cancel_display_updates()
         self.bpm = None
         self.file_path = None
         self.audio_processed = False
+        self.awaiting_processing = False
+        self.chords_generation += 1
+        self.process_button.config(state=tk.NORMAL)
 
         self.elapsed_time_label.config(text="Elapsed Time: 0.00s")
         self.current_chord_label.config(text="Current Chord: N/A")
         self.next_chord_label.config(text="Next Chord: N/A")
+        self.track_info_label.config(text="Track: N/A")
         self.start_continue_button.config(text="Start")
+        self.chords_timeline = ChordTimeline()
+        self.waveform_view.clear()
         self.open_file()
         self.enter_bpm()
-        self.chords_timeline = []
 
     def update_chord_display(self):
-        """Update the display of the current and next chords based on the elapsed time."""
-        elapsed_time = self.elapsed_time
-        current_chord, next_chord = "N/A", "N/A"
-
-        for i, (chord, start_time) in enumerate(self.chords_timeline):
-            next_chord_start_time = self.chords_timeline[i + 1][1] if i + 1 < len(self.chords_timeline) else float('inf')
-            if start_time <= elapsed_time < next_chord_start_time:
-                current_chord = chord
-                next_chord = self.chords_timeline[i + 1][0] if i + 1 < len(self.chords_timeline) else "N/A"
-                break
+        """
+        Update the display of the current and next chords, and while playing schedule the next
+        update for the moment the chord changes.
+        """
+        if self.chord_update_job is not None:
+            self.after_cancel(self.chord_update_job)
+            self.chord_update_job = None
+        position = self.current_position() if self.playing else self.elapsed_time
+        current_chord, next_chord = self.chords_timeline.chords_at(position)
 
         self.current_chord_label.config(text=f"Current Chord: {current_chord}")
         self.next_chord_label.config(text=f"Next Chord: {next_chord}")
 
+        if self.playing:
+            next_change = self.chords_timeline.next_change_after(position)
+            if next_change is not None:
+                delay_ms = max(1, math.ceil((next_change - position) * 1000))
+                self.chord_update_job = self.after(delay_ms, self.update_chord_display)
+
     def check_audio_end(self):
-        """Continuously check if the audio has finished playing and reset the player if it has."""
-        def check():
-            while True:
-                time.sleep(1)
-                if not pygame.mixer.music.get_busy() and self.playing:
-                    self.reset_audio()
-                    break
-
-        threading.Thread(target=check, daemon=True).start()
+        """Check once a second if the audio has finished playing and reset the player if it has."""
+        if not pygame.mixer.music.get_busy() and self.playing:
+            self.reset_audio()
+        self.after(1000, self.check_audio_end)
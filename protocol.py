@@ -0,0 +1,103 @@
+import struct
+
+# Message types sent by the client
+MSG_NON_ESSENTIAL = 0
+MSG_SIGNUP = 1
+MSG_SIGNIN = 2
+MSG_SET_BPM = 3
+MSG_OPEN_FILE = 4
+MSG_PROCESS_AUDIO = 5
+MSG_QUIT = 6
+MSG_SET_TRANSPOSE = 7
+MSG_STATS = 8
+MSG_METADATA = 9
+
+# A request whose type has this bit set carries a 4-byte request ID after the usual
+# (type, length) header, and its reply is framed as (request ID, length) instead of (length).
+# Requests without the bit are answered in order with the original framing.
+REQUEST_ID_FLAG = 0x80000000
+
+
+def recv_exactly(sock, n):
+    """
+    Receive exactly n bytes from a socket.
+
+    Parameters:
+    sock (socket): The socket.
+    n (int): The number of bytes to receive.
+
+    Returns:
+    bytes: The received data.
+    """
+    data = b''
+    while len(data) < n:
+        packet = sock.recv(n - len(data))
+        if not packet:
+            raise ConnectionError("Socket connection broken")
+        data += packet
+    return data
+
+
+def pack_request(message_type, payload, request_id=None):
+    """
+    Frame an encrypted request.
+
+    Parameters:
+    message_type (int): One of the MSG_* types.
+    payload (bytes): The encrypted message.
+    request_id (int): Optional request ID; when given the server may answer out of order.
+
+    Returns:
+    bytes: The framed request.
+    """
+    if request_id is None:
+        return struct.pack('>II', message_type, len(payload)) + payload
+    return struct.pack('>III', message_type | REQUEST_ID_FLAG, len(payload), request_id) + payload
+
+
+def read_request(sock):
+    """
+    Read one framed request.
+
+    Parameters:
+    sock (socket): The socket.
+
+    Returns:
+    tuple: Message type, request ID (None for untagged requests) and the encrypted message.
+    """
+    message_type, message_length = struct.unpack('>II', recv_exactly(sock, 8))
+    request_id = None
+    if message_type & REQUEST_ID_FLAG:
+        message_type &= ~REQUEST_ID_FLAG
+        request_id = struct.unpack('>I', recv_exactly(sock, 4))[0]
+    return message_type, request_id, recv_exactly(sock, message_length)
+
+
+def pack_response(payload, request_id=None):
+    """
+    Frame an encrypted response.
+
+    Parameters:
+    payload (bytes): The encrypted response.
+    request_id (int): ID of the request being answered, or None for an untagged request.
+
+    Returns:
+    bytes: The framed response.
+    """
+    if request_id is None:
+        return struct.pack('>I', len(payload)) + payload
+    return struct.pack('>II', request_id, len(payload)) + payload
+
+
+def read_tagged_response(sock):
+    """
+    Read one response to a tagged request.
+
+    Parameters:
+    sock (socket): The socket.
+
+    Returns:
+    tuple: The request ID and the encrypted response.
+    """
+    request_id, response_length = struct.unpack('>II', recv_exactly(sock, 8))
+    return request_id, recv_exactly(sock, response_length)
@@ -1,16 +1,41 @@
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
+import os
 
 class RSAEncryption:
-    def __init__(self):
-        # Generate a new private key using RSA algorithm with a public exponent of 65537 and a key size of 2048 bits
-        self.private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048
-        )
+    def __init__(self, private_key_pem=None):
+        if private_key_pem is None:
+            # Generate a new private key using RSA algorithm with a public exponent of 65537 and a key size of 2048 bits
+            self.private_key = rsa.generate_private_key(
+                public_exponent=65537,
+                key_size=2048
+            )
+        else:
+            # Reuse an existing identity, e.g. one shared by several server processes
+            self.private_key = serialization.load_pem_private_key(private_key_pem, password=None)
         # Derive the public key from the private key
         self.public_key = self.private_key.public_key()
 
+    @classmethod
+    def from_key_file(cls, key_path):
+        # Load the private key from key_path, generating and saving it (readable by the owner only) if it does not exist
+        if os.path.exists(key_path):
+            with open(key_path, 'rb') as key_file:
+                return cls(key_file.read())
+        encryption = cls()
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as key_file:
+            key_file.write(encryption.get_private_key_pem())
+        return encryption
+
+    def get_private_key_pem(self):
+        # Return the private key in unencrypted PKCS8 PEM format
+        return self.private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
     def get_public_key_pem(self):
         # Return the public key in PEM format
         return self.public_key.public_bytes(
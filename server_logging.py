@@ -0,0 +1,140 @@
+import argparse
+import collections
+import json
+import sys
+import threading
+import time
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+SENSITIVE_FIELDS = frozenset({'password', 'aes_key', 'email', 'favorite_animal'})
+REDACTED = '***'
+
+
+def parse_event_level(value):
+    """Parse an 'event=LEVEL' override such as 'job_rejected=ERROR'."""
+    event, _, level = value.partition('=')
+    level = level.upper()
+    if not event or level not in LEVELS:
+        raise argparse.ArgumentTypeError(f"expected event=LEVEL with LEVEL one of {', '.join(LEVELS)}")
+    return event, level
+
+
+class StructuredLogger:
+    """
+    This class writes JSON-lines log events from a background thread. Logging on the hot path only
+    checks the level and sampling rate and appends to an in-memory queue; formatting, redaction and
+    I/O happen on the writer thread, so slow consoles never block connection threads.
+    """
+
+    def __init__(self, stream=None, level='INFO', event_levels=None, sample_rates=None, max_queue=100000,
+                 sensitive_fields=SENSITIVE_FIELDS, flush_interval=0.1):
+        """
+        Initialize the logger and start its writer thread.
+
+        Parameters:
+        stream (file): Where to write the log lines, defaults to stdout.
+        level (str): Minimum level written (DEBUG, INFO, WARNING or ERROR).
+        event_levels (dict): Event name -> level, overriding the level passed to log().
+        sample_rates (dict): Event name -> N, writing only every Nth occurrence of that event.
+        max_queue (int): Events queued beyond this are dropped (and counted) instead of blocking.
+        sensitive_fields (set): Field names whose values are replaced before writing.
+        flush_interval (float): Longest time in seconds an event waits in the queue.
+        """
+        self.stream = stream or sys.stdout
+        self.threshold = LEVELS[level]
+        self.event_levels = {event: LEVELS[event_level] for event, event_level in (event_levels or {}).items()}
+        self.sample_rates = dict(sample_rates or {})
+        self.sample_counts = collections.Counter()
+        self.max_queue = max_queue
+        self.sensitive_fields = sensitive_fields
+        self.flush_interval = flush_interval
+        self.queue = collections.deque()
+        self.wakeup = threading.Event()
+        self.dropped = 0
+        self.closed = False
+        self.writer_thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer_thread.start()
+
+    def enabled(self, event, level='INFO'):
+        """Return True if an event at this level would be written (before sampling)."""
+        return self.event_levels.get(event, LEVELS[level]) >= self.threshold
+
+    def log(self, event, level='INFO', **fields):
+        """
+        Queue an event.
+
+        Parameters:
+        event (str): Event name, e.g. 'message_received'.
+        level (str): Level of the event, unless overridden through event_levels.
+        fields: Event fields; values must be JSON serializable (anything else is written with str()).
+        """
+        event_level = self.event_levels.get(event)
+        if event_level is None:
+            event_level = LEVELS[level]
+        if event_level < self.threshold or self.closed:
+            return
+        rate = self.sample_rates.get(event)
+        if rate:
+            # Counter updates may race between threads; sampling only needs to be approximate
+            count = self.sample_counts[event]
+            self.sample_counts[event] = count + 1
+            if count % rate:
+                return
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.queue.append((time.time(), event_level, event, fields))
+        if len(self.queue) == 1:
+            self.wakeup.set()
+
+    def debug(self, event, **fields):
+        """Queue an event at DEBUG level."""
+        self.log(event, 'DEBUG', **fields)
+
+    def info(self, event, **fields):
+        """Queue an event at INFO level."""
+        self.log(event, 'INFO', **fields)
+
+    def warning(self, event, **fields):
+        """Queue an event at WARNING level."""
+        self.log(event, 'WARNING', **fields)
+
+    def error(self, event, **fields):
+        """Queue an event at ERROR level."""
+        self.log(event, 'ERROR', **fields)
+
+    def format_event(self, timestamp, event_level, event, fields):
+        """Format one event as a JSON line, redacting sensitive fields."""
+        record = {'ts': round(timestamp, 6), 'level': LEVEL_NAMES[event_level], 'event': event}
+        for name, value in fields.items():
+            record[name] = REDACTED if name in self.sensitive_fields and value else value
+        return json.dumps(record, default=str)
+
+    def write_loop(self):
+        """Writer thread: drain the queue in batches until the logger is closed."""
+        while True:
+            if not self.queue:
+                if self.closed:
+                    return
+                self.wakeup.wait(self.flush_interval)
+                self.wakeup.clear()
+            lines = []
+            while self.queue and len(lines) < 1000:
+                lines.append(self.format_event(*self.queue.popleft()))
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(self.format_event(time.time(), LEVELS['WARNING'], 'log_events_dropped', {'count': dropped}))
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass  # Never let a broken log stream take the server down
+
+    def close(self):
+        """Write the remaining events and stop the writer thread."""
+        self.closed = True
+        self.wakeup.set()
+        self.writer_thread.join()
+
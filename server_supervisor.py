@@ -0,0 +1,112 @@
+import os
+import signal
+import time
+from rsa import RSAEncryption
+from Server import Server
+
+
+class ServerSupervisor:
+    """
+    This class forks several Server processes that accept on the same port through SO_REUSEPORT.
+    The workers share one RSA identity and the feature/results caches and user database on disk.
+    Crashed workers are restarted, and SIGTERM or SIGINT drains the whole pool gracefully.
+    """
+
+    def __init__(self, workers, server_options, rsa_key_path, restart_delay=1.0, drain_timeout=30.0):
+        """
+        Initialize the supervisor.
+
+        Parameters:
+        workers (int): Number of server processes.
+        server_options (dict): Keyword arguments passed to every Server.
+        rsa_key_path (str): Private key file shared by the workers (created if missing).
+        restart_delay (float): Minimum seconds between restarts of the same worker slot.
+        drain_timeout (float): Seconds the workers get to finish open connections on shutdown.
+        """
+        self.workers = workers
+        self.server_options = server_options
+        self.rsa_key_path = rsa_key_path
+        self.restart_delay = restart_delay
+        self.drain_timeout = drain_timeout
+        self.children = {}  # pid -> worker slot
+        self.last_start = {}  # worker slot -> time the slot was last started
+        self.stopping = False
+
+    def spawn_worker(self, slot):
+        """
+        Fork one worker process.
+
+        Parameters:
+        slot (int): Index of the worker, used for logging and restart bookkeeping.
+        """
+        pid = os.fork()
+        if pid:
+            self.children[pid] = slot
+            self.last_start[slot] = time.time()
+            return
+        # Child: serve until SIGTERM, then drain and exit without running the parent's cleanup
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor forwards shutdown as SIGTERM
+            server = Server(rsa_key_path=self.rsa_key_path, drain_timeout=self.drain_timeout, **self.server_options)
+            signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+            print(f"Worker {slot} started with pid {os.getpid()}")
+            server.start(reuse_port=True)
+        except BaseException as e:
+            print(f"Worker {slot} failed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def handle_shutdown(self, signum, frame):
+        """Forward a shutdown signal to every worker."""
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f"Supervisor draining {len(self.children)} workers...")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """Start the workers and supervise them until they have all exited after a shutdown signal."""
+        # Create the shared identity once so every worker loads the same key
+        RSAEncryption.from_key_file(self.rsa_key_path)
+        signal.signal(signal.SIGTERM, self.handle_shutdown)
+        signal.signal(signal.SIGINT, self.handle_shutdown)
+
+        for slot in range(self.workers):
+            self.spawn_worker(slot)
+        print(f"Supervisor {os.getpid()} running {self.workers} workers on port {self.server_options.get('port')}")
+
+        deadline = None
+        while self.children:
+            if self.stopping and deadline is None:
+                deadline = time.time() + self.drain_timeout + 5
+            try:
+                # Never block: a blocking waitpid resumes after the shutdown signal's handler and
+                # would wait forever on a stuck worker, never reaching the kill deadline
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if deadline is not None and time.time() > deadline:
+                    for pid in list(self.children):
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                time.sleep(0.1)
+                continue
+
+            slot = self.children.pop(pid)
+            if self.stopping:
+                continue
+            print(f"Worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            # Avoid a tight restart loop when a worker crashes right after starting
+            time.sleep(max(0.0, self.last_start[slot] + self.restart_delay - time.time()))
+            if not self.stopping:
+                self.spawn_worker(slot)
+        print("Supervisor stopped")
@@ -159,8 +159,7 @@ class AuthenticatedAudioPlayerApp(tk.Tk):
             response = self.aes.decrypt(encrypted_response).decode()
             if "successful" in response:
                 self.destroy()
-                app = AudioPlayerApp(self.client_socket)
-                app.aes = self.aes  # Ensure AES is passed to the main app
+                app = AudioPlayerApp(self.client_socket, self.aes)
                 app.mainloop()
             else:
                 messagebox.showerror("Sign In Failed", response)
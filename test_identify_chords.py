@@ -0,0 +1,37 @@
+import joblib
+import numpy as np
+from sklearn.dummy import DummyClassifier
+from Identify_Chords import ChordIdentifier
+
+SAMPLE_RATE = 22050
+
+
+def chord_bar(frequency, gain, envelope=1.0, seconds=2.0):
+    """Return a bar of a two-tone chord at the given gain, with a little noise."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tones = np.sin(2 * np.pi * frequency * t) + 0.5 * np.sin(2 * np.pi * 1.5 * frequency * t)
+    return gain * envelope * tones + 1e-6 * np.random.default_rng(0).standard_normal(len(t))
+
+
+def test_bar_features_match_per_bar_extraction(tmp_path):
+    """
+    Bar features from the cached frames must match extract_features on the bar's own audio, which
+    is what the model was trained on, also for quiet bars and fades next to loud ones.
+    """
+    model_path = tmp_path / 'model.joblib'
+    joblib.dump(DummyClassifier().fit(np.zeros((2, 40)), ['C', 'G']), model_path)
+    identifier = ChordIdentifier(str(model_path), 120, cache_size=0)
+
+    fade = np.linspace(1.0, 1e-3, 2 * SAMPLE_RATE)
+    bars = [chord_bar(220.0, 1e-3), chord_bar(261.6, 1.0), chord_bar(392.0, 1e-4), chord_bar(196.0, 1.0),
+            chord_bar(246.9, 0.3, fade)]
+    audio = np.concatenate(bars).astype(np.float32)
+
+    frames = identifier.compute_frame_features(audio, SAMPLE_RATE, chunk_frames=300)
+    features, start_times = identifier.segment_features(*frames, identifier.bar_duration(120))
+    assert len(features) == len(bars)
+    for bar_features, start_time in zip(features, start_times):
+        start = int(start_time * SAMPLE_RATE)
+        expected = identifier.extract_features(audio[start:start + 2 * SAMPLE_RATE], SAMPLE_RATE)
+        # Only the frames at the bar edges differ, as they see the neighbouring bars instead of padding
+        assert np.linalg.norm(bar_features - expected) < 0.05 * np.linalg.norm(expected)
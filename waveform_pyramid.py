@@ -0,0 +1,270 @@
+import hashlib
+import os
+import wave
+import numpy as np
+
+
+class PeakPyramid:
+    """
+    This class stores a min/max peak pyramid of a waveform. Level 0 holds the minimum and maximum of
+    every block of base_block samples, and each following level halves the resolution of the previous
+    one, so any zoom level can be drawn from a precomputed level in time proportional to the pixel width.
+    """
+
+    def __init__(self, mins, maxs, sample_rate, num_samples, base_block=256):
+        """
+        Initialize the pyramid from precomputed levels.
+
+        Parameters:
+        mins (list): Per-level arrays of block minimums, finest level first.
+        maxs (list): Per-level arrays of block maximums, finest level first.
+        sample_rate (int): Sample rate of the audio.
+        num_samples (int): Number of samples in the audio.
+        base_block (int): Number of samples per block in level 0.
+        """
+        self.mins = mins
+        self.maxs = maxs
+        self.sample_rate = sample_rate
+        self.num_samples = num_samples
+        self.base_block = base_block
+
+    @property
+    def duration(self):
+        """Duration of the audio in seconds."""
+        return self.num_samples / self.sample_rate
+
+    @classmethod
+    def from_samples(cls, samples, sample_rate, base_block=256, min_blocks=512):
+        """
+        Build a pyramid from mono samples.
+
+        Parameters:
+        samples (np.ndarray): Mono audio samples in the range [-1, 1].
+        sample_rate (int): Sample rate of the audio.
+        base_block (int): Number of samples per block in level 0.
+        min_blocks (int): Stop adding levels once a level has at most this many blocks.
+
+        Returns:
+        PeakPyramid: The pyramid.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        level_min, level_max = cls.block_peaks(samples, base_block)
+        return cls.from_base_level(level_min, level_max, sample_rate, len(samples), base_block, min_blocks)
+
+    @staticmethod
+    def block_peaks(samples, base_block):
+        """
+        Compute the level-0 minimum and maximum of every block of samples; a partial last block is zero-padded.
+
+        Returns:
+        tuple: Arrays of block minimums and maximums.
+        """
+        padded = np.pad(samples, (0, -len(samples) % base_block)).reshape(-1, base_block)
+        return padded.min(axis=1), padded.max(axis=1)
+
+    @classmethod
+    def from_base_level(cls, level_min, level_max, sample_rate, num_samples, base_block=256, min_blocks=512):
+        """
+        Build a pyramid by halving level 0 until a level has at most min_blocks blocks.
+
+        Parameters:
+        level_min (np.ndarray): Level-0 block minimums.
+        level_max (np.ndarray): Level-0 block maximums.
+        sample_rate (int): Sample rate of the audio.
+        num_samples (int): Number of samples in the audio.
+        base_block (int): Number of samples per block in level 0.
+        min_blocks (int): Stop adding levels once a level has at most this many blocks.
+
+        Returns:
+        PeakPyramid: The pyramid.
+        """
+        mins = [level_min]
+        maxs = [level_max]
+        while len(mins[-1]) > min_blocks:
+            level_min, level_max = mins[-1], maxs[-1]
+            if len(level_min) % 2:
+                level_min = np.append(level_min, level_min[-1])
+                level_max = np.append(level_max, level_max[-1])
+            mins.append(level_min.reshape(-1, 2).min(axis=1))
+            maxs.append(level_max.reshape(-1, 2).max(axis=1))
+        return cls(mins, maxs, sample_rate, num_samples, base_block)
+
+    @classmethod
+    def from_wav(cls, wav_path, base_block=256, chunk_blocks=4096):
+        """
+        Build a pyramid from a WAV file, reading it in chunks and mixing it down to mono. Each chunk
+        is a whole number of blocks, so its level-0 peaks are computed as soon as it is decoded and
+        only the peaks are kept, never the whole track's samples.
+
+        Parameters:
+        wav_path (str): Path to the WAV file.
+        base_block (int): Number of samples per block in level 0.
+        chunk_blocks (int): Number of blocks decoded per read.
+
+        Returns:
+        PeakPyramid: The pyramid.
+        """
+        with wave.open(wav_path, 'rb') as wav_file:
+            sample_rate = wav_file.getframerate()
+            channels = wav_file.getnchannels()
+            sample_width = wav_file.getsampwidth()
+            num_samples = 0
+            chunk_mins, chunk_maxs = [], []
+            while True:
+                frames = wav_file.readframes(base_block * chunk_blocks)
+                if not frames:
+                    break
+                samples = cls.decode_frames(frames, sample_width).reshape(-1, channels).mean(axis=1)
+                num_samples += len(samples)
+                chunk_min, chunk_max = cls.block_peaks(samples, base_block)
+                chunk_mins.append(chunk_min)
+                chunk_maxs.append(chunk_max)
+        if not chunk_mins:
+            return cls.from_samples(np.zeros(0, dtype=np.float32), sample_rate, base_block)
+        return cls.from_base_level(np.concatenate(chunk_mins), np.concatenate(chunk_maxs), sample_rate,
+                                   num_samples, base_block)
+
+    @staticmethod
+    def decode_frames(frames, sample_width):
+        """
+        Convert raw PCM bytes to float samples in the range [-1, 1].
+
+        Parameters:
+        frames (bytes): Raw little-endian PCM data.
+        sample_width (int): Bytes per sample.
+
+        Returns:
+        np.ndarray: Float samples, interleaved by channel.
+        """
+        if sample_width == 1:
+            return (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+        if sample_width == 2:
+            return np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768
+        if sample_width == 3:
+            raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            values = np.where(values >= 1 << 23, values - (1 << 24), values)
+            return values.astype(np.float32) / (1 << 23)
+        if sample_width == 4:
+            return np.frombuffer(frames, dtype='<i4').astype(np.float32) / (1 << 31)
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+
+    def level_for(self, samples_per_pixel):
+        """
+        Choose the coarsest level whose blocks are not wider than one pixel.
+
+        Parameters:
+        samples_per_pixel (float): Number of audio samples covered by one pixel.
+
+        Returns:
+        int: The level index.
+        """
+        level = 0
+        while level + 1 < len(self.mins) and self.base_block * 2 ** (level + 1) <= samples_per_pixel:
+            level += 1
+        return level
+
+    def render(self, start_time, end_time, width):
+        """
+        Compute one min/max pair per pixel column for the given time range.
+
+        Parameters:
+        start_time (float): Start of the visible range in seconds.
+        end_time (float): End of the visible range in seconds.
+        width (int): Number of pixel columns.
+
+        Returns:
+        tuple: Arrays of per-column minimums and maximums (empty if the range holds no audio).
+        """
+        if width <= 0 or end_time <= start_time:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+        samples_per_pixel = (end_time - start_time) * self.sample_rate / width
+        level = self.level_for(samples_per_pixel)
+        block = self.base_block * 2 ** level
+        level_min, level_max = self.mins[level], self.maxs[level]
+
+        first = max(0, int(start_time * self.sample_rate // block))
+        last = min(len(level_min), int(np.ceil(end_time * self.sample_rate / block)))
+        if last <= first:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        # Map every column to the first block it covers; zoomed in past level 0 columns repeat blocks
+        columns = min(width, int(np.ceil((min(end_time, self.duration) - start_time) / (end_time - start_time) * width)))
+        if columns <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+        edges = first + (np.arange(columns) * (last - first) / columns).astype(np.int64)
+        if last - first >= columns:
+            return np.minimum.reduceat(level_min[first:last], edges - first), \
+                np.maximum.reduceat(level_max[first:last], edges - first)
+        return level_min[edges], level_max[edges]
+
+    def save(self, cache_path):
+        """
+        Save the pyramid to an .npz file.
+
+        Parameters:
+        cache_path (str): Path to the .npz file.
+        """
+        arrays = {}
+        for level, (level_min, level_max) in enumerate(zip(self.mins, self.maxs)):
+            arrays[f'min_{level}'] = level_min
+            arrays[f'max_{level}'] = level_max
+        np.savez(cache_path, sample_rate=self.sample_rate, num_samples=self.num_samples,
+                 base_block=self.base_block, levels=len(self.mins), **arrays)
+
+    @classmethod
+    def load(cls, cache_path):
+        """
+        Load a pyramid saved with save.
+
+        Parameters:
+        cache_path (str): Path to the .npz file.
+
+        Returns:
+        PeakPyramid: The pyramid.
+        """
+        with np.load(cache_path, allow_pickle=False) as cache:
+            levels = int(cache['levels'])
+            return cls([cache[f'min_{level}'] for level in range(levels)],
+                       [cache[f'max_{level}'] for level in range(levels)],
+                       int(cache['sample_rate']), int(cache['num_samples']), int(cache['base_block']))
+
+
+def track_cache_key(audio_file):
+    """
+    Build a cache key that changes whenever the file at the given path changes.
+
+    Parameters:
+    audio_file (str): Path to the audio file.
+
+    Returns:
+    str: Hex digest of the absolute path, size and modification time.
+    """
+    stat = os.stat(audio_file)
+    identity = f"{os.path.abspath(audio_file)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(identity.encode()).hexdigest()
+
+
+def load_or_build_pyramid(wav_path, cache_dir=os.path.join(os.path.expanduser('~'), '.chords_cache', 'pyramids')):
+    """
+    Return the peak pyramid of a WAV file, building and caching it on first use.
+
+    Parameters:
+    wav_path (str): Path to the WAV file.
+    cache_dir (str): Directory holding cached pyramids.
+
+    Returns:
+    PeakPyramid: The pyramid.
+    """
+    cache_path = os.path.join(cache_dir, track_cache_key(wav_path) + '.npz')
+    if os.path.exists(cache_path):
+        try:
+            return PeakPyramid.load(cache_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable pyramid cache {cache_path}: {e}")
+    pyramid = PeakPyramid.from_wav(wav_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = cache_path + f'.{os.getpid()}.tmp.npz'
+    pyramid.save(temp_path)
+    os.replace(temp_path, cache_path)
+    return pyramid
@@ -0,0 +1,148 @@
+import tkinter as tk
+from chord_timeline import ChordTimeline
+
+
+class WaveformView(tk.Frame):
+    """
+    This class draws a scrollable, zoomable waveform with a chord lane underneath it.
+    Every redraw is rendered from a PeakPyramid, so its cost depends on the canvas width only.
+    """
+
+    def __init__(self, master, height=140, lane_height=24, **kwargs):
+        """
+        Initialize the view.
+
+        Parameters:
+        master (tk.Widget): Parent widget.
+        height (int): Height of the waveform area in pixels.
+        lane_height (int): Height of the chord lane in pixels.
+        """
+        super().__init__(master, bg='#282a36', **kwargs)
+        self.wave_height = height
+        self.lane_height = lane_height
+        self.pyramid = None
+        self.chords_timeline = ChordTimeline()
+        self.view_start = 0.0
+        self.view_duration = 0.0
+        self.playhead = None
+
+        self.canvas = tk.Canvas(self, height=height + lane_height, bg='#21222c', highlightthickness=0)
+        self.canvas.pack(fill=tk.X)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.scroll)
+        self.scrollbar.pack(fill=tk.X)
+
+        controls = tk.Frame(self, bg='#282a36')
+        controls.pack()
+        tk.Button(controls, text="Zoom In", command=lambda: self.zoom(0.5), bg='#6272a4', fg='white').pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Zoom Out", command=lambda: self.zoom(2.0), bg='#6272a4', fg='white').pack(side=tk.LEFT, padx=5)
+
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom(0.8 if e.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom(0.8))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom(1.25))
+
+    def set_pyramid(self, pyramid):
+        """Show a new track, zoomed out to its full length."""
+        self.pyramid = pyramid
+        self.view_start = 0.0
+        self.view_duration = pyramid.duration if pyramid else 0.0
+        self.redraw()
+
+    def set_chords(self, chords_timeline):
+        """Show a new chord timeline in the chord lane."""
+        self.chords_timeline = chords_timeline
+        self.redraw()
+
+    def clear(self):
+        """Remove the track and chords from the view."""
+        self.pyramid = None
+        self.chords_timeline = ChordTimeline()
+        self.playhead = None
+        self.redraw()
+
+    def zoom(self, factor):
+        """
+        Zoom around the centre of the visible range.
+
+        Parameters:
+        factor (float): Multiplier for the visible duration (below 1 zooms in).
+        """
+        if not self.pyramid:
+            return
+        centre = self.view_start + self.view_duration / 2
+        min_duration = self.pyramid.base_block / self.pyramid.sample_rate * 16
+        self.view_duration = min(self.pyramid.duration, max(min_duration, self.view_duration * factor))
+        self.view_start = centre - self.view_duration / 2
+        self.clamp_view()
+        self.redraw()
+
+    def scroll(self, *args):
+        """Handle scrollbar commands."""
+        if not self.pyramid:
+            return
+        if args[0] == tk.MOVETO:
+            self.view_start = float(args[1]) * self.pyramid.duration
+        elif args[0] == tk.SCROLL:
+            step = self.view_duration if args[2] == tk.PAGES else self.view_duration / 10
+            self.view_start += int(args[1]) * step
+        self.clamp_view()
+        self.redraw()
+
+    def clamp_view(self):
+        """Keep the visible range inside the track."""
+        self.view_start = max(0.0, min(self.view_start, self.pyramid.duration - self.view_duration))
+
+    def time_to_x(self, seconds, width):
+        """Convert a time in seconds to a canvas x coordinate."""
+        return (seconds - self.view_start) / self.view_duration * width
+
+    def redraw(self):
+        """Redraw the waveform, chord lane and playhead for the visible range."""
+        self.canvas.delete("all")
+        width = self.canvas.winfo_width()
+        if not self.pyramid or self.view_duration <= 0 or width <= 1:
+            self.scrollbar.set(0, 1)
+            return
+        view_end = self.view_start + self.view_duration
+        self.scrollbar.set(self.view_start / self.pyramid.duration, view_end / self.pyramid.duration)
+
+        middle = self.wave_height / 2
+        mins, maxs = self.pyramid.render(self.view_start, view_end, width)
+        for x, (low, high) in enumerate(zip(mins, maxs)):
+            self.canvas.create_line(x, middle - high * middle, x, middle - low * middle + 1, fill='#8be9fd')
+
+        # Only the chords overlapping the visible range are drawn
+        lane_top = self.wave_height
+        first = max(0, self.chords_timeline.index_at(self.view_start))
+        last = self.chords_timeline.index_at(view_end)
+        for index in range(first, last + 1):
+            start = self.chords_timeline.start_times[index]
+            end = self.chords_timeline.start_times[index + 1] if index + 1 < len(self.chords_timeline) else self.pyramid.duration
+            x0, x1 = max(0, self.time_to_x(start, width)), min(width, self.time_to_x(end, width))
+            self.canvas.create_rectangle(x0, lane_top, x1, lane_top + self.lane_height, fill='#44475a', outline='#6272a4')
+            self.canvas.create_text((x0 + x1) / 2, lane_top + self.lane_height / 2,
+                                    text=self.chords_timeline.chords[index], fill='white')
+        self.draw_playhead()
+
+    def set_playhead(self, position):
+        """
+        Move the playhead, scrolling the view when it leaves the visible range.
+
+        Parameters:
+        position (float): Playback position in seconds, or None to hide the playhead.
+        """
+        self.playhead = position
+        if self.pyramid and position is not None and not self.view_start <= position < self.view_start + self.view_duration:
+            self.view_start = position
+            self.clamp_view()
+            self.redraw()
+        else:
+            self.draw_playhead()
+
+    def draw_playhead(self):
+        """Draw the playhead line without redrawing the rest of the view."""
+        self.canvas.delete("playhead")
+        width = self.canvas.winfo_width()
+        if self.pyramid and self.playhead is not None and self.view_duration > 0:
+            x = self.time_to_x(self.playhead, width)
+            self.canvas.create_line(x, 0, x, self.wave_height + self.lane_height, fill='#ff5555', tags="playhead")